@@ -1,8 +1,16 @@
-from flask import Flask, render_template, Response, jsonify, request
+from flask import Flask, render_template, Response, jsonify, request, g
+import contextlib
+import math
 import threading
 import cv2
 import time
 import calibrate
+import cam
+import drift
+import framebus
+import journal
+import memdiag
+import replay
 
 app = Flask(__name__, template_folder="templates")
 
@@ -10,60 +18,480 @@ app = Flask(__name__, template_folder="templates")
 # Shared camera capture
 # ---------------------------
 class CameraThread:
-    def __init__(self, index=0):
-        self.cap = cv2.VideoCapture(index)
-        self.lock = threading.Lock()
+    """Background reader that keeps the capture queue drained.
+
+    Every frame is stamped with a sequence number and a monotonic timestamp
+    (the V4L2 buffer timestamp when the driver provides one), so callers can
+    ask for a frame that was exposed *after* an action instead of sleeping.
+
+    With `bus_name` set, frames are also published to a shared-memory
+    `framebus.FrameBus` so other processes can read the same camera.
+
+    Frames are read into two pooled buffers that swap roles, so steady-state
+    capture does not allocate; callers always get copies.
+
+    Capture is demand driven: while nobody consumes frames (no stream
+    client, no waiter in next_frame_after/wait_for, no `consumer()` such as a
+    recorder, no frame bus reader in another process) the reader drops to
+    `idle_fps`. A new consumer wakes it at once, so full rate resumes within
+    one frame interval; it stays there for `ACTIVE_HOLD` seconds after the
+    last consumer left. idle_fps=None keeps full rate all the time.
+    """
+
+    # seconds at full rate after the last consumer left
+    ACTIVE_HOLD = 2.0
+
+    def __init__(self, index=0, buffer_size=1, bus_name=None, fps=replay.DEFAULT_FPS,
+                 idle_fps=2.0):
+        # index: camera number, or a video/image path to replay (see replay.py)
+        self.cap = replay.open_source(index, fps=fps)
+        # ask the backend for a short queue; the reader below drains whatever is left
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        except Exception:
+            pass
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+        self.frame_interval = 1.0 / fps if 0 < fps < 240 else 1.0 / 30
+        self.buffer_size = max(1, int(buffer_size))
+        self.lock = threading.Condition()
         self.running = True
         self.frame = None
-        t = threading.Thread(target=self._reader, daemon=True)
-        t.start()
+        self.seq = 0
+        self.timestamp = 0.0
+        self.bus_name = bus_name
+        self.bus = None
+        self.pool = memdiag.BufferPool("capture", max_free=2)
+        self.idle_fps = idle_fps
+        self.consumers = {}
+        self.mode = "active"
+        self.mode_switches = 0
+        self.mode_time = {"active": 0.0, "idle": 0.0}
+        self.measured_fps = 0.0
+        now = time.monotonic()
+        self._mode_since = now
+        self._last_demand = now
+        self._last_read = 0.0
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+
+    def _frame_timestamp(self, t_read):
+        """Best estimate of when the frame just read was exposed.
+
+        V4L2 reports the buffer timestamp on CLOCK_MONOTONIC (in ms), which
+        is the clock behind time.monotonic(). If the value is missing or on
+        another clock, fall back to a conservative estimate: the frame can
+        have waited behind at most `buffer_size` queued buffers.
+        """
+        try:
+            drv = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        except Exception:
+            drv = 0.0
+        if drv > 0 and abs(t_read - drv) < 1.0:
+            return drv
+        return t_read - (self.buffer_size + 1) * self.frame_interval
+
+    # -- demand tracking -------------------------------------------------
+
+    def _enter(self, kind):
+        # caller holds self.lock
+        self.consumers[kind] = self.consumers.get(kind, 0) + 1
+        self._last_demand = time.monotonic()
+        self.lock.notify_all()
+
+    def _leave(self, kind):
+        # caller holds self.lock
+        self.consumers[kind] -= 1
+        self._last_demand = time.monotonic()
+
+    @contextlib.contextmanager
+    def consumer(self, kind):
+        """Keep capture at full rate while the block runs (stream client, recorder, ...)."""
+        with self.lock:
+            self._enter(kind)
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._leave(kind)
+
+    def _demanded(self, now):
+        # caller holds self.lock
+        if self.idle_fps is None or any(self.consumers.values()):
+            return True
+        last = self._last_demand
+        if self.bus is not None:
+            last = max(last, self.bus.last_demand())
+        return now - last < self.ACTIVE_HOLD
+
+    def _set_mode(self, mode, now):
+        if mode != self.mode:
+            self.mode_time[self.mode] += now - self._mode_since
+            self.mode, self._mode_since = mode, now
+            self.mode_switches += 1
+
+    def _idle_wait(self):
+        """In idle mode, sleep until the next idle frame is due or demand appears.
+
+        Returns True if a frame should be read now.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self._demanded(now):
+                self._set_mode("active", now)
+                return True
+            self._set_mode("idle", now)
+            due = self._last_read + 1.0 / self.idle_fps
+            while self.running and now < due:
+                # wake at least once per frame interval to notice frame bus readers
+                self.lock.wait(min(self.frame_interval, due - now))
+                now = time.monotonic()
+                if self._demanded(now):
+                    self._set_mode("active", now)
+                    break
+        # drop the frame that queued up while idle so the next read is fresh
+        try:
+            self.cap.grab()
+        except Exception:
+            pass
+        return self.running
+
+    def metrics(self):
+        with self.lock:
+            now = time.monotonic()
+            times = dict(self.mode_time)
+            times[self.mode] += now - self._mode_since
+            return {
+                "mode": self.mode,
+                "target_fps": (1.0 / self.frame_interval if self.mode == "active"
+                               else self.idle_fps),
+                "measured_fps": round(self.measured_fps, 2),
+                "idle_fps": self.idle_fps,
+                "consumers": {k: v for k, v in self.consumers.items() if v},
+                "bus_demand_age": (now - self.bus.last_demand()
+                                   if self.bus is not None and self.bus.last_demand() else None),
+                "mode_switches": self.mode_switches,
+                "mode_seconds": {k: round(v, 1) for k, v in times.items()},
+                "seq": self.seq,
+            }
+
+    # -- capture ------------------------------------------------------------
 
     def _reader(self):
+        back = None
         while self.running:
-            ok, frame = self.cap.read()
+            if self.idle_fps is not None and not self._idle_wait():
+                break
+            # read into the back buffer; readers only touch self.frame under the lock
+            ok, frame = self.cap.read(back) if back is not None else self.cap.read()
             if ok:
+                now = time.monotonic()
+                if self._last_read:
+                    # rate averaged over roughly the last second, whatever the mode
+                    dt = max(now - self._last_read, 1e-3)
+                    self.measured_fps += (1.0 - math.exp(-dt)) * (1.0 / dt - self.measured_fps)
+                self._last_read = now
+                ts = self._frame_timestamp(now)
+                if frame is not back:
+                    # first frame or size change: the backend allocated a new buffer
+                    self.pool.release(back)
+                    self.pool.adopt(frame)
                 with self.lock:
-                    self.frame = frame
+                    front, self.frame = self.frame, frame
+                    self.seq += 1
+                    self.timestamp = ts
+                    self.lock.notify_all()
+                self._publish(frame, ts)
+                if front is not None and front.shape == frame.shape:
+                    back = front
+                else:
+                    self.pool.release(front)
+                    back = self.pool.acquire(frame.shape)
             else:
                 time.sleep(0.1)
 
+    def _publish(self, frame, ts):
+        if self.bus_name is None:
+            return
+        try:
+            if self.bus is None or self.bus.shape != frame.shape:
+                if self.bus is not None:
+                    self.bus.close()
+                self.bus = framebus.FrameBus.create(frame.shape, name=self.bus_name)
+            self.bus.publish(frame, ts)
+        except Exception as e:
+            print("framebus disabled:", e)
+            self.bus_name = None
+
     def get_frame(self):
         with self.lock:
-            return None if self.frame is None else self.frame.copy()
+            return None if self.frame is None else memdiag.track("frame", self.frame.copy())
+
+    def get_frame_stamped(self):
+        """Return (frame, timestamp, seq) of the latest frame, frame may be None."""
+        with self.lock:
+            if self.frame is None:
+                return None, 0.0, 0
+            return memdiag.track("frame", self.frame.copy()), self.timestamp, self.seq
+
+    def copy_latest(self, dst, rect=None):
+        """Copy the latest frame (or its [x,y,w,h] rect) into dst and return (timestamp, seq).
+
+        Returns (0.0, 0) if there is no frame yet or the shapes differ.
+        """
+        with self.lock:
+            if self.frame is None:
+                return 0.0, 0
+            src = self.frame if rect is None else cam.crop(self.frame, rect)
+            if src.shape != dst.shape:
+                return 0.0, 0
+            dst[...] = src
+            return self.timestamp, self.seq
+
+    def wait_seq(self, seq, timeout=2.0):
+        """Block until a frame newer than `seq` exists; returns its (seq, shape) or (0, None)."""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if self.frame is None or self.seq <= seq:
+                self._enter("waiter")
+                try:
+                    while self.frame is None or self.seq <= seq:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self.running:
+                            return 0, None
+                        self.lock.wait(remaining)
+                finally:
+                    self._leave("waiter")
+            return self.seq, self.frame.shape
+
+    def next_frame_after(self, t, timeout=2.0):
+        """Block until a frame exposed after monotonic time `t` is available.
+
+        Returns (frame, timestamp) or (None, 0.0) on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if self.frame is None or self.timestamp <= t:
+                self._enter("waiter")
+                try:
+                    while self.frame is None or self.timestamp <= t:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self.running:
+                            return None, 0.0
+                        self.lock.wait(remaining)
+                finally:
+                    self._leave("waiter")
+            return memdiag.track("frame", self.frame.copy()), self.timestamp
+
+    def wait_for(self, predicate, after=None, timeout=5.0):
+        """Wait for the first frame after `after` for which predicate(frame) is true.
+
+        `after` defaults to now. Returns (frame, latency) where latency is the
+        time between `after` and the exposure of the matching frame, or
+        (None, None) on timeout.
+        """
+        t = time.monotonic() if after is None else after
+        start = t
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, None
+            frame, ts = self.next_frame_after(t, timeout=remaining)
+            if frame is None:
+                return None, None
+            if predicate(frame):
+                return frame, ts - start
+            t = ts
 
     def stop(self):
         self.running = False
+        with self.lock:
+            self.lock.notify_all()
         try:
             self.cap.release()
         except Exception:
             pass
+        # the reader also uses the bus; let it finish its last iteration first
+        self._thread.join(timeout=1.0)
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+# The camera is opened on first use (or by startup()), not at import time.
+# CAMERA_SOURCE is a camera index or a replay path (set by --source).
+CAMERA_SOURCE = 0
+REPLAY_FPS = replay.DEFAULT_FPS
+# capture rate while nobody consumes frames (None = always full rate, set by --idle-fps)
+IDLE_FPS = 2.0
+_camera = None
+_camera_lock = threading.Lock()
+
+def get_camera():
+    global _camera
+    if _camera is None:
+        with _camera_lock:
+            if _camera is None:
+                _camera = CameraThread(CAMERA_SOURCE, bus_name=framebus.FRAMEBUS_NAME,
+                                       fps=REPLAY_FPS, idle_fps=IDLE_FPS)
+    return _camera
+
+class EncodeCache:
+    """Images derived from the latest frame, encoded once per frame seq.
+
+    Entries are keyed by what is rendered (annotated full frame, a region
+    view, a snapshot). The first consumer asking for a key at a new frame seq
+    copies the frame (or just the rect it needs) into a pooled buffer,
+    scales it into a second pooled buffer if asked to, renders and encodes
+    it; every other consumer of that key and seq - all MJPEG clients of one
+    stream, repeated snapshot requests - reuses the encoded buffer, so cost
+    and memory do not grow with the number of viewers. The only per-frame
+    allocation left is the one cv2.imencode makes for its output, which is
+    served as a memoryview and tracked by memdiag as "encoded".
+    """
+
+    # keys change with every recalibration of a region view; keep the most recent ones
+    MAX_ENTRIES = 32
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.lock = threading.Lock()
+        self.pool = memdiag.BufferPool("stream", max_free=8)
+        self.entries = {}
+
+    def _entry(self, key):
+        with self.lock:
+            e = self.entries.get(key)
+            if e is None:
+                if len(self.entries) >= self.MAX_ENTRIES:
+                    old = self.entries.pop(min(self.entries, key=lambda k: self.entries[k]["used"]))
+                    with old["lock"]:
+                        self.pool.release(old["buf"])
+                        self.pool.release(old["scaled"])
+                        old["buf"] = old["scaled"] = None
+                e = self.entries[key] = {"lock": threading.Lock(), "seq": 0, "timestamp": 0.0,
+                                         "data": None, "buf": None, "scaled": None,
+                                         "encoded": 0, "served": 0}
+            e["used"] = time.monotonic()
+            return e
+
+    def get(self, key, render=None, rect=None, ext='.jpg', after=0, timeout=1.0, size=None):
+        """Return (memoryview, timestamp, seq) for the newest frame with seq > after.
+
+        rect: [x,y,w,h] part of the frame to render (default: whole frame),
+        size: optional (w, h) to scale that copy to before rendering,
+        render: optional function drawing on / transforming the image.
+        Returns (None, 0.0, after) on timeout.
+        """
+        latest, shape = self.camera.wait_seq(after, timeout)
+        if not latest:
+            return None, 0.0, after
+        e = self._entry(key)
+        with e["lock"]:
+            if e["seq"] < latest:
+                if rect is not None:
+                    shape = (rect[3], rect[2]) + tuple(shape[2:])
+                if e["buf"] is None or e["buf"].shape != shape:
+                    self.pool.release(e["buf"])
+                    e["buf"] = self.pool.acquire(shape)
+                ts, cur = self.camera.copy_latest(e["buf"], rect)
+                if not cur:
+                    return None, 0.0, after
+                img = e["buf"]
+                if size is not None and tuple(size) != img.shape[1::-1]:
+                    shape = (size[1], size[0]) + img.shape[2:]
+                    if e["scaled"] is None or e["scaled"].shape != shape:
+                        self.pool.release(e["scaled"])
+                        e["scaled"] = self.pool.acquire(shape)
+                    up = size[0] > img.shape[1]
+                    img = cv2.resize(img, tuple(size), dst=e["scaled"],
+                                     interpolation=cv2.INTER_LINEAR if up else cv2.INTER_AREA)
+                if render is not None:
+                    try:
+                        img = render(img)
+                    except Exception:
+                        pass
+                ret, enc = cv2.imencode(ext, img)
+                e["seq"], e["timestamp"] = cur, ts
+                # the encoded buffer itself is served; consumers never write to it
+                e["data"] = memoryview(memdiag.track("encoded", enc.reshape(-1))) if ret else None
+                e["encoded"] += 1
+            e["served"] += 1
+            return e["data"], e["timestamp"], e["seq"]
 
-cam = CameraThread()
-
-# ---------------------------
-# Helper to interop w/ calibrate module
-# ---------------------------
-def _list_regions_safe():
-    for fname in ("list_regions", "get_saved_regions", "get_regions"):
-        fn = getattr(calibrate, fname, None)
-        if callable(fn):
-            try:
-                res = fn()
-                if isinstance(res, dict):
-                    return res
-                if isinstance(res, (list, tuple)):
-                    out = {}
-                    for item in res:
-                        if isinstance(item, dict) and "name" in item and "rect" in item:
-                            out[item["name"]] = item["rect"]
-                    return out
-            except Exception:
-                pass
-    for attr in ("REGIONS", "regions", "SAVED_REGIONS"):
-        obj = getattr(calibrate, attr, None)
-        if isinstance(obj, dict):
-            return obj
-    return {}
+    def stats(self):
+        with self.lock:
+            items = list(self.entries.items())
+        return {"/".join(map(str, k)) if isinstance(k, tuple) else k:
+                {"seq": e["seq"], "bytes": len(e["data"]) if e["data"] else 0,
+                 "encoded": e["encoded"], "served": e["served"]}
+                for k, e in items}
+
+_encoded = None
+
+def get_encoded():
+    global _encoded
+    if _encoded is None:
+        # opened outside _camera_lock: get_camera() takes it itself
+        camera = get_camera()
+        with _camera_lock:
+            if _encoded is None:
+                _encoded = EncodeCache(camera)
+    return _encoded
+
+# ---------------------------
+# Startup / warm-up
+# ---------------------------
+startup_info = {"ready": False, "timings": {}, "error": None}
+drift_tracker = None
+
+def startup(warmup=True, warmup_frames=5, drift_interval=None):
+    """Open the camera and optionally warm up before reporting ready.
+
+    Warm-up grabs a few frames, preloads region templates, state stacks and
+    glyph sets, runs each region matcher once and primes the OCR engine.
+    Each step's duration (seconds) is recorded in startup_info["timings"].
+    With drift_interval set, a drift.DriftTracker is started at that rate.
+    """
+    timings = startup_info["timings"]
+    t0 = time.perf_counter()
+    try:
+        t = time.perf_counter()
+        camera = get_camera()
+        timings["camera_open"] = time.perf_counter() - t
+        frame = None
+        if warmup:
+            t = time.perf_counter()
+            for _ in range(warmup_frames):
+                frame, _ts = camera.next_frame_after(time.monotonic(), timeout=2.0)
+                if frame is None:
+                    break
+            timings["first_frames"] = time.perf_counter() - t
+            for step, dt in cam.warmup(frame=frame).items():
+                timings[step] = dt
+        if drift_interval:
+            global drift_tracker
+            drift_tracker = drift.DriftTracker(camera.get_frame, interval=drift_interval)
+            drift_tracker.start()
+    except Exception as e:
+        startup_info["error"] = str(e)
+    timings["total"] = time.perf_counter() - t0
+    # a camera that failed to open stays not ready (/api/ready keeps returning 503)
+    startup_info["ready"] = startup_info["error"] is None
+    print("Startup:", ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items() if v is not None))
+
+# ---------------------------
+# Journal of API calls (only when started with --journal)
+# ---------------------------
+@app.before_request
+def _journal_start():
+    g.t_request = time.monotonic()
+
+@app.after_request
+def _journal_request(resp):
+    if journal.get_journal() is not None and 't_request' in g:
+        journal.log("api", name=request.path, method=request.method, status=resp.status_code,
+                    ms=round((time.monotonic() - g.t_request) * 1000, 2))
+    return resp
 
 # ---------------------------
 # process state
@@ -93,26 +521,123 @@ def calibrate_page():
 # ---------------------------
 # MJPEG feed
 # ---------------------------
-def gen_camera():
-    while True:
-        frame = cam.get_frame()
-        if frame is None:
-            time.sleep(0.05)
-            continue
-        try:
-            disp = calibrate.get_annotated_frame(frame)
-        except Exception:
-            disp = frame
-        ret, jpeg = cv2.imencode('.jpg', disp)
-        if not ret:
-            continue
-        data = jpeg.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + data + b'\r\n')
+def _annotate(img):
+    return calibrate.get_annotated_frame(img, out=img)
+
+def gen_mjpeg(view, render=None):
+    """Multipart JPEG stream, one part per new frame.
+
+    view() returns (cache key, rect or None, size or None) for the current
+    frame, or None while there is nothing to show yet.
+    """
+    cache = get_encoded()
+    last_seq = 0
+    with cache.camera.consumer("stream"):
+        while True:
+            v = view()
+            if v is None:
+                time.sleep(0.1)
+                continue
+            # only send frames the client has not seen yet; encoding is shared
+            data, ts, seq = cache.get(v[0], render, v[1], after=last_seq, size=v[2])
+            if data is None:
+                # a frame that failed to encode is skipped, not asked for again;
+                # when no newer seq came back, back off instead of spinning
+                if seq <= last_seq:
+                    time.sleep(0.05)
+                last_seq = max(last_seq, seq)
+                continue
+            last_seq = seq
+            # capture time as wall clock so clients (e.g. loadtest.py) can measure latency
+            captured = ts + (time.time() - time.monotonic())
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n'
+                   + b'Content-Length: %d\r\n' % len(data)
+                   + b'X-Capture-Time: %.6f\r\n\r\n' % captured
+                   + data + b'\r\n')
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_camera(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(gen_mjpeg(lambda: ('annotated', None, None), _annotate),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# ---------------------------
+# Region views (crop streams and snapshots for calibration)
+# ---------------------------
+# context around a region in its view, relative to the region size
+REGION_VIEW_PAD = 0.5
+# longer side of an encoded region view in pixels (crops are scaled up)
+REGION_VIEW_SIZE = 360
+
+def region_view(name, pad=REGION_VIEW_PAD):
+    """[x,y,w,h] of the frame shown for a region: the rect plus context, or the whole frame.
+
+    pad is the context relative to the region size; the result is clipped to
+    the frame. Returns None while there is no frame yet.
+    """
+    camera = get_camera()
+    with camera.lock:
+        shape = None if camera.frame is None else camera.frame.shape
+    if shape is None:
+        return None
+    fh, fw = shape[:2]
+    rect = calibrate.regions_snapshot().regions.get(name)
+    if not rect:
+        return [0, 0, fw, fh]
+    x, y, w, h = map(int, rect)
+    pad = int(max(w, h) * pad)
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(fw, x + w + pad), min(fh, y + h + pad)
+    if x1 <= x0 or y1 <= y0:
+        return [0, 0, fw, fh]
+    return [x0, y0, x1 - x0, y1 - y0]
+
+def _view_size(rect):
+    # (w, h) a region view is encoded at: its longer side REGION_VIEW_SIZE
+    w, h = rect[2], rect[3]
+    f = REGION_VIEW_SIZE / float(max(w, h))
+    return (max(1, round(w * f)), max(1, round(h * f)))
+
+@app.route('/video_feed/region/<name>')
+def video_feed_region(name):
+    # the view follows recalibration; each (name, view) is cached per frame seq
+    def view():
+        r = region_view(name)
+        return None if r is None else (('region', name) + tuple(r), r, _view_size(r))
+    return Response(gen_mjpeg(view),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/region_views')
+def api_region_views():
+    names = request.args.getlist('name') or list(calibrate.regions_snapshot().regions)
+    return jsonify({n: region_view(n) for n in names})
+
+def _cached_image(key, rect, ext, mimetype):
+    data, ts, seq = get_encoded().get(key, None, rect, ext=ext, timeout=2.0)
+    if data is None:
+        return jsonify({'error':'no frame'}), 503
+    etag = f'{key if isinstance(key, str) else "-".join(map(str, key))}-{seq}'
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(data.tobytes(), mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Frame-Seq'] = str(seq)
+    return resp
+
+@app.route('/api/snapshot.jpg')
+def api_snapshot():
+    return _cached_image('snapshot', None, '.jpg', 'image/jpeg')
+
+@app.route('/api/region/<name>.png')
+def api_region_png(name):
+    if name not in calibrate.regions_snapshot().regions:
+        return jsonify({'error': f'unknown region {name}'}), 404
+    rect = region_view(name, pad=0)
+    if rect is None:
+        return jsonify({'error':'no frame'}), 503
+    return _cached_image(('region_png', name) + tuple(rect), rect, '.png', 'image/png')
 
 # ---------------------------
 # APIs - status & control
@@ -121,6 +646,50 @@ def video_feed():
 def api_status():
     return jsonify(state)
 
+@app.route('/api/camera')
+def api_camera():
+    # capture mode (active/idle), rates and current consumers
+    return jsonify(get_camera().metrics())
+
+@app.route('/api/drift')
+def api_drift():
+    if drift_tracker is None:
+        return jsonify({'state': 'disabled'})
+    return jsonify(drift_tracker.status)
+
+# ---------------------------
+# APIs - diagnostics
+# ---------------------------
+@app.route('/api/diag/memory', methods=['GET', 'POST'])
+def api_diag_memory():
+    # POST {"trace": true, "frames": 10} starts tracemalloc, {"trace": false} stops it.
+    # Each GET while tracing diffs against the previous GET.
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        if data.get('trace'):
+            memdiag.start_tracing(int(data.get('frames', 10)))
+        else:
+            memdiag.stop_tracing()
+    limit = request.args.get('top', default=20, type=int)
+    return jsonify({
+        'rss': memdiag.rss(),
+        'pools': memdiag.pool_stats(),
+        'live': memdiag.live_stats(),
+        'encoded': _encoded.stats() if _encoded is not None else None,
+        'tracemalloc': memdiag.snapshot_report(limit),
+    })
+
+@app.route('/api/journal')
+def api_journal():
+    j = journal.get_journal()
+    if j is None:
+        return jsonify({'state': 'disabled'})
+    return jsonify(dict(j.stats(), directory=j.directory))
+
+@app.route('/api/ready')
+def api_ready():
+    return jsonify(startup_info), (200 if startup_info["ready"] else 503)
+
 @app.route('/api/start')
 def api_start():
     count = request.args.get("count", default=4, type=int)
@@ -137,6 +706,7 @@ def api_send_number():
         return jsonify({'error':'missing value'}), 400
     # Hier kannst du tun, was du willst – Logging, Weiterverarbeitung etc.
     print("Received number:", val)
+    journal.log("number", value=val)
     return jsonify({'received': val})
 
 @app.route('/api/stop')
@@ -160,41 +730,134 @@ def api_resume():
 # ---------------------------
 @app.route('/api/regions', methods=['GET'])
 def api_regions():
-    regions = _list_regions_safe()
-    sane = {k: [int(v[0]), int(v[1]), int(v[2]), int(v[3])]
-            for k, v in regions.items()
-            if isinstance(v, (list, tuple)) and len(v) == 4}
-    return jsonify({"regions": sane})
+    # ?wait=<seconds> long-polls until the regions differ from If-None-Match
+    snap = calibrate.regions_snapshot()
+    wait = request.args.get('wait', default=0.0, type=float)
+    if wait > 0 and request.if_none_match.contains(snap.etag):
+        snap = calibrate.wait_regions_change(snap.etag, min(wait, 60.0))
+    if request.if_none_match.contains(snap.etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify({"regions": snap.regions, "version": snap.version})
+    resp.set_etag(snap.etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+# ---------------------------
+# APIs - region score history & threshold tuning
+# ---------------------------
+# the histories are shared files (cam.HISTORY_DIR), so these see the scores
+# of whichever process runs match(); only calibrated regions have one
+def _unknown_region(name):
+    if cam._normalize_name(name) not in calibrate.list_regions():
+        return jsonify({'error': f'unknown region {name}'}), 404
+    return None
+
+@app.route('/api/regions/<name>/history')
+def api_region_history(name):
+    err = _unknown_region(name)
+    if err:
+        return err
+    snap = cam.score_history(name).snapshot()
+    return jsonify({k: v.tolist() for k, v in snap.items()})
+
+@app.route('/api/regions/<name>/confirm', methods=['POST'])
+def api_region_confirm(name):
+    err = _unknown_region(name)
+    if err:
+        return err
+    data = request.get_json() or {}
+    if 'matched' not in data:
+        return jsonify({'error':'missing matched'}), 400
+    n = cam.confirm(name, bool(data['matched']), data.get('since'), data.get('until'))
+    return jsonify({'labelled': n})
+
+@app.route('/api/regions/<name>/tune', methods=['GET', 'POST'])
+def api_region_tune(name):
+    err = _unknown_region(name)
+    if err:
+        return err
+    res = cam.tune_threshold(name)
+    if res is None:
+        return jsonify({'error':'need confirmed matches and non-matches first'}), 409
+    out = res._asdict()
+    if request.method == 'POST':
+        key = cam._normalize_name(name)
+        out['applied'] = calibrate.set_region_options(key, threshold=round(res.threshold, 4))
+    return jsonify(out)
 
 # ---------------------------
 # Existing calibration APIs
 # ---------------------------
 @app.route('/api/calibrate_all')
 def api_calibrate_all():
-    frame = cam.get_frame()
+    frame = get_camera().get_frame()
     if frame is None:
         return jsonify({ 'error': 'no frame' }), 400
     try:
-        res = calibrate.save_all_regions_from_frame(frame)
-        return jsonify({'saved': res})
+        job = calibrate.submit_save_all_regions(frame)
+        return jsonify({'job': job}), 202
     except KeyError as e:
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/calibrate_save', methods=['POST'])
 def api_calibrate_save():
+    data = request.get_json() or {}
+    # either a single {name, rect} or a batch {regions: {name: rect, ...}}
+    regions = data.get('regions')
+    if not regions:
+        name = data.get('name')
+        rect = data.get('rect')
+        if not name or not rect:
+            return jsonify({'error':'missing name or rect'}), 400
+        regions = {name: rect}
+    if not all(isinstance(r, (list, tuple)) and len(r) == 4 for r in regions.values()):
+        return jsonify({'error':'rect must be [x,y,w,h]'}), 400
+    frame = get_camera().get_frame()
+    if frame is None:
+        return jsonify({'error':'no frame available on server'}), 400
+    job = calibrate.submit_save_regions(regions, frame)
+    journal.snapshot(frame, "calibrate", job=job, regions=regions)
+    return jsonify({'job': job}), 202
+
+@app.route('/api/calibrate_job/<job_id>')
+def api_calibrate_job(job_id):
+    job = calibrate.job_status(job_id)
+    if job is None:
+        return jsonify({'error':'unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/api/calibrate_state', methods=['POST'])
+def api_calibrate_state():
     data = request.get_json() or {}
     name = data.get('name')
-    rect = data.get('rect')
-    if not name or not rect:
-        return jsonify({'error':'missing name or rect'}), 400
-    frame = cam.get_frame()
+    label = data.get('label')
+    if not name or not label:
+        return jsonify({'error':'missing name or label'}), 400
+    frame = get_camera().get_frame()
     if frame is None:
         return jsonify({'error':'no frame available on server'}), 400
     try:
-        path = calibrate.save_region_from_frame(name, rect, frame)
+        path = calibrate.save_state_from_frame(name, label, frame)
         return jsonify({'path': path})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/calibrate_glyphs', methods=['POST'])
+def api_calibrate_glyphs():
+    data = request.get_json() or {}
+    name = data.get('name', 'Info_text')
+    text = data.get('text')
+    if not text:
+        return jsonify({'error':'missing text'}), 400
+    frame = get_camera().get_frame()
+    if frame is None:
+        return jsonify({'error':'no frame available on server'}), 400
+    try:
+        n = calibrate.learn_glyphs_from_frame(name, text, frame)
+        return jsonify({'learned': n})
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
 # ---------------------------
 # Goal API
@@ -208,10 +871,37 @@ def api_goal():
     msg = f"Found it: {val}!!"
     state['goal_msg'] = msg
     state['running'] = False
+    journal.snapshot(get_camera().get_frame(), "goal", value=val)
     return jsonify({'msg': msg})
 
 # ---------------------------
 # App runner
 # ---------------------------
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Pi-Droid web server")
+    parser.add_argument('--no-warmup', action='store_true', help="skip the warm-up phase")
+    parser.add_argument('--drift', type=float, default=None, metavar='SECONDS',
+                        help="track camera/phone drift every SECONDS and correct regions")
+    parser.add_argument('--source', default='0',
+                        help="camera index, a video file / image directory to replay, or synth[:seed]")
+    parser.add_argument('--fps', type=float, default=replay.DEFAULT_FPS,
+                        help="frame rate when replaying a file or directory")
+    parser.add_argument('--tracemalloc', type=int, default=0, metavar='FRAMES',
+                        help="trace allocations from the start (see /api/diag/memory)")
+    parser.add_argument('--journal', default=None, metavar='DIR',
+                        help="record region checks, OCR, HID, servo and API events to DIR")
+    parser.add_argument('--idle-fps', type=float, default=IDLE_FPS,
+                        help="capture rate while no client consumes frames (0 = always full rate)")
+    args = parser.parse_args()
+    IDLE_FPS = args.idle_fps if args.idle_fps > 0 else None
+    if args.journal:
+        journal.open_journal(args.journal)
+    if args.tracemalloc:
+        memdiag.start_tracing(args.tracemalloc)
+    CAMERA_SOURCE = args.source
+    REPLAY_FPS = args.fps
+    # serve right away; /api/ready turns 200 once warm-up is done
+    threading.Thread(target=startup, kwargs={"warmup": not args.no_warmup,
+                                             "drift_interval": args.drift}, daemon=True).start()
     app.run(host='0.0.0.0', port=8080, threaded=True)
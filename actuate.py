@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+actuate.py
+
+Button actions (UP / DOWN / PWR) with two backends:
+
+  - "hid":   a Consumer Control report (Volume Up / Volume Down / Power) on
+             the composite gadget's /dev/hidg1 (see setup_hid_gadget.sh).
+             Reaches the phone within one USB polling interval.
+  - "servo": the relais servo pressing the physical button, which takes
+             hundreds of milliseconds.
+
+By default ("auto") a press goes through HID when the consumer device exists
+and is not busy with a press of another button, and through the servo
+otherwise. Presses of the same button never overlap: they wait for each
+other whatever the backend, so e.g. a long DOWN hold is over before the
+next DOWN starts. A HID
+press whose report never got out (device gone, host not polling, e.g. after
+relais.switch_usb("usb")) is repeated on the servo. Once the press report
+was delivered there is no fallback: if the release then fails, the press
+counts as failed and the release is retried, but the button is not pressed
+a second time by the servo.
+
+Each press is timed per backend: `latency` from the call until the button
+is down and `duration` until it was released. For HID "down" is when the
+gadget accepted the report (it takes a new one only after the host fetched
+the previous one). For the servo it is when the press angle was commanded
+plus the estimated travel time (SERVO_SECONDS_PER_DEGREE), since the
+servo gives no feedback. `stats()` summarizes them and every press is
+recorded in the journal as an "actuate" event.
+
+Usage:
+    import actuate
+    actuate.UP()                 # non-blocking, returns the Thread like relais.UP
+    r = actuate.press("PWR", seconds=5)   # blocking, returns an Actuation
+    actuate.wait()               # until all non-blocking presses are done
+    print(actuate.stats())
+
+CLI:
+    python actuate.py UP --repeat 10
+    python actuate.py PWR --backend servo
+"""
+
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+import argparse
+import json
+import os
+import threading
+import time
+
+import hid_input
+import journal
+import relais
+
+BUTTONS = ("UP", "DOWN", "PWR")
+BACKENDS = ("auto", "hid", "servo")
+USAGES = {
+    "UP": hid_input.VOLUME_UP_USAGE,
+    "DOWN": hid_input.VOLUME_DOWN_USAGE,
+    "PWR": hid_input.POWER_USAGE,
+}
+# same defaults as relais.UP / DOWN / PWR
+SERVO_ANGLES = {"UP": 60, "DOWN": 120, "PWR": 60}
+# how long the host may take to fetch a report before the press counts as failed
+HID_TIMEOUT = 0.5
+# further attempts to get the release out after the first one timed out
+RELEASE_RETRIES = 3
+# SG90-class servos: about 0.1 s per 60 degrees without load
+SERVO_SECONDS_PER_DEGREE = 0.1 / 60
+# presses kept per backend for stats()
+STATS_SIZE = 256
+
+DEVICE = hid_input.CONSUMER_DEVICE
+# the consumer report holds one usage, so HID presses cannot overlap; it is
+# held for the whole press, since a second report would release the first
+_hid_lock = threading.Lock()
+# presses of one button run one after the other
+_button_locks = {b: threading.Lock() for b in BUTTONS}
+# presses started by UP / DOWN / PWR that have not finished yet
+_active: Set[threading.Thread] = set()
+
+
+class Actuation(NamedTuple):
+    """Outcome of one press."""
+    button: str
+    backend: str  # "hid" or "servo"
+    ok: bool
+    latency: float  # seconds until the button was down (servo: including estimated travel)
+    duration: float  # seconds until it was released
+
+
+# backend -> recent (latency, duration) of successful presses
+_times: Dict[str, Deque[Tuple[float, float]]] = {
+    "hid": deque(maxlen=STATS_SIZE), "servo": deque(maxlen=STATS_SIZE)}
+_failures: Dict[str, int] = {"hid": 0, "servo": 0}
+_stats_lock = threading.Lock()
+
+
+def hid_available(device: Optional[Path] = None) -> bool:
+    return Path(device or DEVICE).exists()
+
+
+def _release_hid(fd: int, length: int) -> Optional[str]:
+    """Send the release report, retrying; returns the last error or None."""
+    error = None
+    for _ in range(1 + RELEASE_RETRIES):
+        try:
+            hid_input.write_report(fd, bytes(length), HID_TIMEOUT)
+            return None
+        except (OSError, TimeoutError) as e:
+            error = f"release failed: {e}"
+    return error
+
+
+def _press_hid(button: str, seconds: float, t0: float) -> Tuple[Actuation, Optional[str]]:
+    """Press via the consumer report; returns the result and an error, if any.
+
+    Raises OSError / TimeoutError only when the press report was never
+    delivered, i.e. when repeating the press on the servo is safe.
+    """
+    report = hid_input.consumer_report(USAGES[button])
+    fd = hid_input.open_nonblocking(DEVICE)
+    try:
+        try:
+            hid_input.write_report(fd, report, HID_TIMEOUT)
+        except (OSError, TimeoutError):
+            # not delivered; make sure no half-sent state is left behind
+            try:
+                os.write(fd, bytes(len(report)))
+            except OSError:
+                pass
+            raise
+        latency = time.monotonic() - t0
+        time.sleep(seconds)
+        error = _release_hid(fd, len(report))
+    finally:
+        os.close(fd)
+    return Actuation(button, "hid", error is None, latency, time.monotonic() - t0), error
+
+
+def _press_servo(button: str, seconds: float, t0: float) -> Actuation:
+    angle = SERVO_ANGLES[button]
+    pressed = threading.Event()
+    t = relais._start_press_thread(button, press_angle=angle, hold=float(seconds), pressed=pressed)
+    if not t:
+        return Actuation(button, "servo", False, 0.0, 0.0)
+    # the worker may wait for an earlier press on the same servo; it only
+    # never sets the event when it died
+    while not pressed.wait(0.05):
+        if not t.is_alive():
+            return Actuation(button, "servo", False, 0.0, time.monotonic() - t0)
+    travel = abs(angle - relais._REST_ANGLE) * SERVO_SECONDS_PER_DEGREE
+    latency = time.monotonic() - t0 + travel
+    t.join()
+    return Actuation(button, "servo", True, latency, time.monotonic() - t0)
+
+
+def press(button: str, seconds: float = 0.1, backend: str = "auto") -> Actuation:
+    """Press a button for `seconds` and block until it is released."""
+    button = button.upper()
+    if button not in BUTTONS:
+        raise ValueError(f"button must be one of {', '.join(BUTTONS)}")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+    t0 = time.monotonic()
+    result, error = None, None
+    with _button_locks[button]:
+        if backend == "hid" or (backend == "auto" and hid_available()):
+            # in auto mode an overlapping press of another button goes to the servo instead
+            if _hid_lock.acquire(blocking=backend == "hid"):
+                try:
+                    result, error = _press_hid(button, seconds, t0)
+                except (OSError, TimeoutError) as e:
+                    # the press never reached the host, so the servo may press instead
+                    _record(Actuation(button, "hid", False, 0.0, time.monotonic() - t0), str(e))
+                    if backend == "hid":
+                        raise
+                finally:
+                    _hid_lock.release()
+        if result is None:
+            result = _press_servo(button, seconds, t0)
+    _record(result, error)
+    return result
+
+
+def _record(result: Actuation, error: Optional[str] = None) -> None:
+    with _stats_lock:
+        if result.ok:
+            _times[result.backend].append((result.latency, result.duration))
+        else:
+            _failures[result.backend] += 1
+    journal.log("actuate", name=result.button, backend=result.backend, ok=result.ok,
+                latency=round(result.latency, 4), duration=round(result.duration, 4), error=error)
+
+
+def _start(button: str, seconds: float, backend: str = "auto"):
+    def worker():
+        try:
+            press(button, seconds, backend)
+        finally:
+            _active.discard(threading.current_thread())
+
+    t = threading.Thread(target=worker, daemon=True)
+    _active.add(t)
+    t.start()
+    return t
+
+
+def wait(timeout: Optional[float] = None) -> None:
+    """Wait for the presses started by UP / DOWN / PWR (e.g. before relais.cleanup())."""
+    for t in list(_active):
+        t.join(timeout)
+
+
+def UP(seconds: float = 0.1, backend: str = "auto"):
+    """Volume up; returns the Thread running the press (see relais.UP)."""
+    return _start("UP", seconds, backend)
+
+
+def DOWN(seconds: float = 0.1, backend: str = "auto"):
+    """Volume down; returns the Thread running the press."""
+    return _start("DOWN", seconds, backend)
+
+
+def PWR(seconds: float = 0.1, backend: str = "auto"):
+    """Power button; returns the Thread running the press."""
+    return _start("PWR", seconds, backend)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(p / 100.0 * (len(v) - 1))))] if v else 0.0
+
+
+def stats() -> Dict[str, dict]:
+    """Per backend: press count, failures and latency / duration percentiles in ms."""
+    out = {}
+    with _stats_lock:
+        snapshot = {b: (list(t), _failures[b]) for b, t in _times.items()}
+    for backend, (times, failures) in snapshot.items():
+        lat = [t[0] for t in times]
+        dur = [t[1] for t in times]
+        out[backend] = {
+            "count": len(times),
+            "failures": failures,
+            "latency_p50_ms": round(_percentile(lat, 50) * 1000, 2),
+            "latency_p95_ms": round(_percentile(lat, 95) * 1000, 2),
+            "latency_max_ms": round(max(lat, default=0.0) * 1000, 2),
+            "duration_p50_ms": round(_percentile(dur, 50) * 1000, 2),
+        }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Press UP / DOWN / PWR via HID or servo and time it.")
+    parser.add_argument("button", choices=BUTTONS, type=str.upper)
+    parser.add_argument("--seconds", "-s", type=float, default=0.1, help="Hold time")
+    parser.add_argument("--backend", "-b", choices=BACKENDS, default="auto")
+    parser.add_argument("--repeat", "-n", type=int, default=1)
+    parser.add_argument("--pause", type=float, default=0.5, help="Seconds between presses")
+    parser.add_argument("--json", action="store_true", help="Print the stats as JSON")
+    args = parser.parse_args()
+
+    for i in range(args.repeat):
+        if i:
+            time.sleep(args.pause)
+        r = press(args.button, args.seconds, args.backend)
+        print(f"{r.button:<5} {r.backend:<6} {'ok' if r.ok else 'FAILED':<7}"
+              f"latency {r.latency * 1000:8.1f}ms  duration {r.duration * 1000:8.1f}ms")
+    s = stats()
+    if args.json:
+        print(json.dumps(s, indent=2))
+    else:
+        for backend, v in s.items():
+            if v["count"] or v["failures"]:
+                print(f"{backend:<6} n={v['count']} failed={v['failures']} "
+                      f"latency p50 {v['latency_p50_ms']}ms p95 {v['latency_p95_ms']}ms "
+                      f"max {v['latency_max_ms']}ms")
+    relais.cleanup_and_wait(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
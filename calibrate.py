@@ -1,13 +1,26 @@
 # calibrate.py
 import cv2 as cv
-import json, os, time
+import numpy as np
+import io, json, os, re, time, tempfile, threading, itertools, zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cam
 
 CAMERA_INDEX = 0
 WIDTH, HEIGHT = 1280, 720
 TEMPLATE_DIR = "templates"
 CONFIG_PATH = "config.json"
-
-os.makedirs(TEMPLATE_DIR, exist_ok=True)
+# full frame of the last calibration, used by drift.py as feature reference
+REFERENCE_PATH = os.path.join(TEMPLATE_DIR, "reference.png")
+# learned samples kept per glyph label (newest win)
+MAX_GLYPH_SAMPLES = 8
+# image encoding workers for calibration saves
+SAVE_WORKERS = 2
+# finished save jobs kept for /api/calibrate_job polling
+MAX_JOBS = 64
+# state labels become file names under templates/states/<name>/
+LABEL_RE = re.compile(r"[A-Za-z0-9_-]+")
 
 # Auswahlrechteck per Maus
 sel = None
@@ -28,10 +41,208 @@ def load_config():
         "REGIONS": {}
     }
 
-def save_config(cfg):
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(cfg, f, indent=2)
+def _atomic_write(path, data):
+    """Write bytes to path via a temp file + rename, so readers never see half a file."""
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_image(path, img):
+    ok, buf = cv.imencode(os.path.splitext(path)[1] or ".png", img)
+    if not ok:
+        raise RuntimeError(f"Failed to encode {path}")
+    _atomic_write(path, buf.tobytes())
+    return path
+
+
+# serializes load-modify-save of config.json within this process
+_store_lock = threading.RLock()
+
+
+def save_config(cfg, recalibrated=False):
+    """Atomically write config.json and bump its VERSION counter.
+
+    recalibrated: region templates and reference.png were captured anew, so
+    also bump CALIBRATION (drift.py corrections are tied to that counter,
+    not to VERSION, which every option change bumps).
+    """
+    with _store_lock:
+        cfg["VERSION"] = int(cfg.get("VERSION", 0)) + 1
+        if recalibrated:
+            cfg["CALIBRATION"] = int(cfg.get("CALIBRATION", 0)) + 1
+        _atomic_write(CONFIG_PATH, json.dumps(cfg, indent=2).encode("utf-8"))
     print("[OK] config.json gespeichert.")
+    regions_snapshot()  # refresh the registry and wake long-polling readers
+
+
+def set_region_options(name, **options):
+    """Update REGION_OPTIONS[name] in config.json (e.g. threshold, matcher)."""
+    with _store_lock:
+        cfg = load_config()
+        cfg.setdefault("REGION_OPTIONS", {}).setdefault(name, {}).update(options)
+        save_config(cfg)
+    return cfg["REGION_OPTIONS"][name]
+
+
+def record_scale_scores(name, positives, negatives):
+    """Measure and store the score separation of a region per analysis scale.
+
+    positives/negatives are full frames with / without the region's template
+    state. The result lands in REGION_OPTIONS[name]["scale_scores"], which
+    cam.match uses to pick the coarsest usable analysis_scale. Returns it.
+    """
+    scores = cam.scale_scores(name, positives, negatives)
+    set_region_options(name, scale_scores={k: list(v) for k, v in scores.items()})
+    return scores
+
+
+def _drop_scale_scores(cfg, names):
+    # scores measured against an older template no longer say anything
+    for name in names:
+        cfg.get("REGION_OPTIONS", {}).get(name, {}).pop("scale_scores", None)
+
+
+def config_version():
+    return int(load_config().get("VERSION", 0))
+
+
+def calibration_id():
+    return int(load_config().get("CALIBRATION", 0))
+
+
+# ---------------------------------------------------------------------------
+# Region registry (cached view of REGIONS for the web API)
+# ---------------------------------------------------------------------------
+
+# (version, etag, regions, calibration) of config.json at one point in time
+RegionSnapshot = namedtuple("RegionSnapshot", "version etag regions calibration")
+
+
+def _regions_etag(regions):
+    # only the regions count: option changes bump VERSION but must not wake pollers
+    return "r%08x" % zlib.crc32(json.dumps(regions, sort_keys=True).encode("utf-8"))
+
+
+_registry_cond = threading.Condition()
+_registry = {"stamp": None, "snapshot": RegionSnapshot(0, _regions_etag({}), {}, 0)}
+
+
+def _config_stamp():
+    # config.json is replaced by rename, so a new inode means a new file even
+    # when mtime and size happen to match
+    try:
+        st = os.stat(CONFIG_PATH)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def regions_snapshot():
+    """Current RegionSnapshot; config.json is only re-read when it changed on disk."""
+    stamp = _config_stamp()
+    with _registry_cond:
+        if stamp == _registry["stamp"]:
+            return _registry["snapshot"]
+    cfg = load_config()
+    regions = {k: [int(v[0]), int(v[1]), int(v[2]), int(v[3])]
+               for k, v in cfg.get("REGIONS", {}).items()
+               if isinstance(v, (list, tuple)) and len(v) == 4}
+    snap = RegionSnapshot(int(cfg.get("VERSION", 0)), _regions_etag(regions), regions,
+                          int(cfg.get("CALIBRATION", 0)))
+    with _registry_cond:
+        changed = snap.etag != _registry["snapshot"].etag
+        _registry["stamp"] = stamp
+        _registry["snapshot"] = snap
+        if changed:
+            _registry_cond.notify_all()
+    return snap
+
+
+def list_regions():
+    """Return dict name -> [x,y,w,h] of the saved regions."""
+    return dict(regions_snapshot().regions)
+
+
+def wait_regions_change(etag, timeout):
+    """Block until the regions differ from `etag` (or timeout); returns a snapshot.
+
+    Saves from this process wake waiters immediately; edits from other
+    processes (e.g. running calibrate.py directly) are noticed within a second.
+    """
+    deadline = time.monotonic() + timeout
+    snap = regions_snapshot()
+    while snap.etag == etag:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        with _registry_cond:
+            _registry_cond.wait(min(1.0, remaining))
+        snap = regions_snapshot()
+    return snap
+
+
+_pool = None
+_job_pool = None
+_jobs = {}
+_job_ids = itertools.count(1)
+_jobs_lock = threading.Lock()
+
+
+def _executor():
+    """Pool that encodes and writes images."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=SAVE_WORKERS, thread_name_prefix="calib-save")
+    return _pool
+
+
+def _job_executor():
+    # jobs wait on the encode pool, so they get their own single thread;
+    # that also applies background saves in submission order
+    global _job_pool
+    if _job_pool is None:
+        _job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calib-job")
+    return _job_pool
+
+
+def _submit(fn, *args):
+    """Run fn in the save pool and return a job id for job_status()."""
+    with _jobs_lock:
+        job_id = str(next(_job_ids))
+        _jobs[job_id] = {"state": "pending"}
+        while len(_jobs) > MAX_JOBS:
+            del _jobs[next(iter(_jobs))]
+
+    def run():
+        try:
+            res = fn(*args)
+            job = {"state": "done", "result": res}
+        except Exception as e:
+            job = {"state": "error", "error": str(e)}
+        with _jobs_lock:
+            _jobs[job_id] = job
+
+    _job_executor().submit(run)
+    return job_id
+
+
+def job_status(job_id):
+    """Return {'state': 'pending'|'done'|'error', ...} or None for unknown ids."""
+    with _jobs_lock:
+        job = _jobs.get(str(job_id))
+        return None if job is None else dict(job)
+
 
 def on_mouse(event, x, y, flags, param):
     global sel, dragging, pt1
@@ -51,6 +262,53 @@ def crop(frame, r):
     return frame[y:y+h, x:x+w]
 
 
+def save_regions_from_frame(regions, frame):
+    """Save several named regions from one BGR frame in one transaction.
+
+    regions: dict name -> (x,y,w,h)
+    frame: BGR image (numpy array)
+
+    PNGs are encoded in parallel on the save pool and renamed into place,
+    then config.json is rewritten once. The first save keeps the full frame
+    as templates/reference.png for drift.py and starts a new CALIBRATION.
+    Later saves of single regions keep both: while drift.py has corrections
+    published, the rects (drawn on the live, drifted frame) are mapped back
+    to reference coordinates and the other regions keep their corrections.
+    Returns dict of name->path.
+    """
+    regions = {name: [int(v) for v in rect] for name, rect in regions.items()}
+    with _store_lock:
+        cfg = load_config()
+        full = not os.path.exists(REFERENCE_PATH)
+        paths = {name: os.path.join(TEMPLATE_DIR, f"region_{name}.png") for name in regions}
+        futs = [_executor().submit(_write_image, paths[name], crop(frame, rect))
+                for name, rect in regions.items()]
+        if full:
+            futs.append(_executor().submit(_write_image, REFERENCE_PATH, frame))
+        for f in futs:
+            f.result()
+        stored = regions if full else _to_reference(cfg, regions)
+        cfg.setdefault("REGIONS", {}).update(stored)
+        _drop_scale_scores(cfg, regions)
+        save_config(cfg, recalibrated=full)
+    return paths
+
+
+def _to_reference(cfg, regions):
+    """Map live-frame rects to reference coordinates and keep drift.json in step."""
+    import drift  # drift imports this module
+    doc = cam._drift_doc(cfg)
+    H = doc.get("H")
+    if not doc.get("regions") or H is None:
+        return regions
+    H = np.array(H, np.float64)
+    overrides = dict(doc["regions"])
+    overrides.update(regions)
+    drift.publish(overrides, cfg.get("CALIBRATION", 0),
+                  {k: v for k, v in doc.items() if k not in ("calibration", "regions", "time")})
+    return drift.transform_regions(regions, np.linalg.inv(H))
+
+
 def save_region_from_frame(name, rect, frame):
     """Save a named region from a provided BGR frame.
 
@@ -58,13 +316,28 @@ def save_region_from_frame(name, rect, frame):
     rect: (x,y,w,h)
     frame: BGR image (numpy array)
     """
-    cfg = load_config()
-    cfg.setdefault("REGIONS", {})[name] = list(rect)
-    os.makedirs(TEMPLATE_DIR, exist_ok=True)
-    path = os.path.join(TEMPLATE_DIR, f"region_{name}.png")
-    cv.imwrite(path, crop(frame, rect))
-    save_config(cfg)
-    return path
+    return save_regions_from_frame({name: rect}, frame)[name]
+
+
+def submit_save_regions(regions, frame):
+    """Non-blocking save_regions_from_frame; returns a job id."""
+    return _submit(save_regions_from_frame, dict(regions), frame)
+
+
+def save_state_from_frame(name, label, frame, rect=None):
+    """Save a state template for a region (used by cam.classify).
+
+    The crop is taken from the region's saved rect unless `rect` is given and
+    stored as templates/states/<name>/<label>.png. Raises ValueError unless
+    name and label are plain names (letters, digits, '_' and '-').
+    """
+    for what, value in (("name", name), ("label", label)):
+        if not isinstance(value, str) or not LABEL_RE.fullmatch(value):
+            raise ValueError(f"invalid {what} {value!r}: use letters, digits, '_' and '-'")
+    if rect is None:
+        rect = load_config().get("REGIONS", {})[name]
+    path = os.path.join(cam.state_dir(name), f"{label}.png")
+    return _write_image(path, crop(frame, rect))
 
 
 def save_all_regions_from_frame(frame):
@@ -76,21 +349,84 @@ def save_all_regions_from_frame(frame):
     regs = cfg.get("REGIONS", {})
     if not regs:
         raise KeyError("No REGIONS defined in config.json to save.")
-    results = {}
-    for name, rect in regs.items():
-        path = os.path.join(TEMPLATE_DIR, f"region_{name}.png")
-        cv.imwrite(path, crop(frame, rect))
-        results[name] = path
-    return results
+    paths = {name: os.path.join(TEMPLATE_DIR, f"region_{name}.png") for name in regs}
+    futs = [_executor().submit(_write_image, paths[name], crop(frame, rect))
+            for name, rect in regs.items()]
+    futs.append(_executor().submit(_write_image, REFERENCE_PATH, frame))
+    for f in futs:
+        f.result()
+    with _store_lock:
+        cfg = load_config()
+        _drop_scale_scores(cfg, regs)
+        save_config(cfg, recalibrated=True)
+    return paths
+
+
+def submit_save_all_regions(frame):
+    """Non-blocking save_all_regions_from_frame; returns a job id.
+
+    Raises KeyError right away if there are no regions to save.
+    """
+    if not load_config().get("REGIONS"):
+        raise KeyError("No REGIONS defined in config.json to save.")
+    return _submit(save_all_regions_from_frame, frame)
+
+
+def learn_glyphs_from_frame(name, text, frame, rect=None):
+    """Learn glyph templates for a region from a frame showing known text.
 
+    name: region key (e.g. 'Info_text'); rect defaults to its saved REGIONS entry
+    text: characters visible in the region, left to right (spaces are ignored)
+    frame: BGR image (numpy array)
+
+    Returns the number of glyphs learned. Raises ValueError when the crop does
+    not segment into exactly one glyph per character.
+    """
+    if rect is None:
+        rect = load_config().get("REGIONS", {})[name]
+    img = crop(frame, rect)
+    mask = cam.glyph_mask(img)
+    boxes = cam.segment_glyphs(mask)
+    chars = [c for c in str(text) if not c.isspace()]
+    if len(boxes) != len(chars):
+        raise ValueError(f"Found {len(boxes)} glyphs in '{name}' but text has {len(chars)} characters")
 
-def get_annotated_frame(frame):
+    labels = list(chars)
+    vectors = list(cam.glyph_vectors(mask, boxes))
+    path = cam.glyph_path(name)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            labels = [str(l) for l in data["labels"]] + labels
+            vectors = list(data["vectors"]) + vectors
+    # keep the newest MAX_GLYPH_SAMPLES per label
+    keep, seen = [], {}
+    for i in range(len(labels) - 1, -1, -1):
+        seen[labels[i]] = seen.get(labels[i], 0) + 1
+        if seen[labels[i]] <= MAX_GLYPH_SAMPLES:
+            keep.append(i)
+    keep.reverse()
+    buf = io.BytesIO()
+    np.savez(buf, labels=np.array([labels[i] for i in keep]),
+             vectors=np.stack([vectors[i] for i in keep]).astype(np.float32))
+    _atomic_write(path, buf.getvalue())
+    print(f"[OK] {len(chars)} Glyphen gelernt: {path}")
+    return len(chars)
+
+
+def get_annotated_frame(frame, out=None):
     """Return a copy of frame annotated with OCR_ROI and saved regions (BGR image).
 
-    This is useful for streaming a live view with overlays.
+    This is useful for streaming a live view with overlays. With `out` (an
+    array of the same shape, may be `frame` itself) the copy is drawn into
+    that buffer instead of a new one.
     """
     cfg = load_config()
-    disp = frame.copy()
+    if out is None:
+        disp = frame.copy()
+    else:
+        if out is not frame:
+            np.copyto(out, frame)
+        disp = out
     # draw OCR ROI
     try:
         rx, ry, rw, rh = cfg.get("OCR_ROI", [0,0,0,0])
@@ -128,7 +464,7 @@ def main():
     # show key mapping for named regions
     win = (
         "Kalibrierung (Ziehen = Auswahl; 1/2=Template; o=OCR-ROI; "
-        "i=Info_text; w=Swipe; c=Code; h=Home; s=Screenshot; q=Quit)"
+        "i=Info_text; w=Swipe; c=Code; h=Home; g=Glyphen; k=Zustand; s=Screenshot; q=Quit)"
     )
     cv.namedWindow(win)
     cv.setMouseCallback(win, on_mouse)
@@ -193,11 +529,27 @@ def main():
             # save named region for OCR later
             name = region_keys.get(chr(k))
             if name:
-                cfg.setdefault("REGIONS", {})[name] = list(sel)
-                path = os.path.join(TEMPLATE_DIR, f"region_{name}.png")
-                cv.imwrite(path, crop(frame, sel))
-                save_config(cfg)
+                path = save_region_from_frame(name, sel, frame)
+                cfg = load_config()
                 print(f"[OK] Region '{name}' gespeichert: {path}")
+        elif k == ord('g'):
+            # learn digit glyphs for Info_text from the text currently shown
+            text = input("Text in Info_text (links nach rechts): ").strip()
+            try:
+                learn_glyphs_from_frame("Info_text", text, frame)
+            except (KeyError, ValueError) as e:
+                print(f"[FEHLER] {e}")
+        elif k == ord('k'):
+            # save the current look of a region as a named state
+            name = input("Region (Info_text/Swipe/Code/Home): ").strip()
+            label = input("Zustand: ").strip()
+            try:
+                path = save_state_from_frame(name, label, frame)
+                print(f"[OK] Zustand '{label}' für '{name}' gespeichert: {path}")
+            except KeyError:
+                print(f"[FEHLER] Region '{name}' nicht gefunden.")
+            except ValueError as e:
+                print(f"[FEHLER] {e}")
         elif k == ord('s'):
             fn = f"screenshot_{int(time.time())}.png"
             cv.imwrite(fn, frame)
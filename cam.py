@@ -8,23 +8,84 @@ Provides two main functions intended for importing and use by an OCR script:
     If not provided, this will try to use pytesseract if available.
   - frame: optional BGR image to use instead of capturing from camera.
 
-- check(name, threshold=0.85, frame=None, camera_index=0)
+- check(name, threshold=0.85, frame=None, camera_index=0, margin=None)
   - name: 'code' or 'home' (case-insensitive)
   - returns True when the live region matches the template image saved by
     `calibrate.py` (templates/region_<Name>.png) above the given threshold.
+  - margin: optional search margin in pixels so small camera shifts still
+    match; `match()` returns the score and location behind the decision.
+
+When a camera is not passed in explicitly, frames come from the shared-memory
+frame bus published by `Server.py` (see `framebus.py`) if one is running, so
+automation scripts and the web server share one camera. Otherwise the camera
+is opened directly.
+
+How a region is compared is selected per region with
+REGION_OPTIONS[<Name>]["matcher"] in config.json: "ncc" (default), "phash",
+"hist" or "meandiff"; `matcher_bench.py` recommends one from recorded frames.
+
+Numeric regions can skip the OCR engine: with
+REGION_OPTIONS[<Name>]["recognizer"] = "glyph", `get_text` first matches
+the glyphs learned by `calibrate.py` and only falls back to tesseract when
+the confidence is low.
+
+Regions with more than two looks can be told apart in one call with
+`classify(name)`, which scores the live crop against all state templates in
+templates/states/<Name>/ and returns the winning label.
+
+All regions of one frame share a single grayscale conversion of the area
+covering them (`frame_gray`); region crops are views into it. Its pyramid
+levels are shared the same way: regions with
+REGION_OPTIONS[<Name>]["analysis_scale"] < 1 are matched on a reduced level,
+at the coarsest scale that keeps the score separation recorded during
+calibration (`analysis_scale`, `scale_scores`); until that was recorded they
+are matched at native resolution.
+
+For several regions of the same frame, `RegionExecutor` runs the OCR or
+template matching jobs on a warm process pool in parallel.
 
 The module reads region coordinates from `config.json` (same format as
-`calibrate.py`) and uses `templates/` for stored region images.
+`calibrate.py`) and uses `templates/` for stored region images. If
+`drift.py` has published corrected coordinates for the current calibration
+(drift.json), those take precedence.
 """
 
-from typing import Callable, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import fcntl
 import json
+import mmap
 import os
+import threading
+import time
 import cv2 as cv
 import numpy as np
 
+import framebus
+import journal
+
 CONFIG_PATH = "config.json"
 TEMPLATE_DIR = "templates"
+# corrected region coordinates published by drift.py
+DRIFT_PATH = "drift.json"
+# frames older than this on the bus are treated as "no publisher running"
+BUS_MAX_AGE = 1.0
+# coarse-to-fine search: stop downsampling before the template gets this small
+MIN_PYRAMID_SIZE = 8
+MAX_PYRAMID_LEVELS = 3
+# margin used around the last hit before searching the full window
+TIGHT_MARGIN = 4
+DEFAULT_THRESHOLD = 0.85
+# REGION_OPTIONS[<Name>]["analysis_scale"] snaps to these: levels 0..3 of the
+# shared frame pyramid
+ANALYSIS_SCALES = tuple(1.0 / (1 << k) for k in range(MAX_PYRAMID_LEVELS + 1))
+# gap a reduced scale must keep between positive and negative scores
+MIN_SCALE_SEPARATION = 0.05
+
+_bus = None
 
 
 def _load_config() -> dict:
@@ -50,8 +111,47 @@ def _normalize_name(name: str) -> str:
     return mapping.get(n, name)
 
 
+def _region_options(cfg: dict, name: str) -> dict:
+    """Optional per-region settings from config.json (REGION_OPTIONS)."""
+    opts = cfg.get("REGION_OPTIONS", {}).get(name)
+    return opts if isinstance(opts, dict) else {}
+
+
+# stat stamp of drift.json -> its parsed content
+_drift_cache: Tuple[Optional[tuple], dict] = (None, {})
+
+
+def _drift_doc(cfg: dict) -> dict:
+    """drift.json as published by drift.DriftTracker, if it applies to cfg."""
+    global _drift_cache
+    try:
+        st = os.stat(DRIFT_PATH)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return {}
+    if stamp != _drift_cache[0]:
+        try:
+            with open(DRIFT_PATH, "r") as f:
+                _drift_cache = (stamp, json.load(f))
+        except (OSError, ValueError):
+            return {}
+    doc = _drift_cache[1]
+    # overrides computed for an older calibration no longer apply
+    if int(doc.get("calibration", -1)) != int(cfg.get("CALIBRATION", 0)):
+        return {}
+    return doc
+
+
+def _drift_overrides(cfg: dict) -> dict:
+    """Region coordinates corrected by drift.DriftTracker, if any apply."""
+    return _drift_doc(cfg).get("regions", {})
+
+
 def _get_region_coords(cfg: dict, name: str) -> Tuple[int, int, int, int]:
     regs = cfg.get("REGIONS", {})
+    r = _drift_overrides(cfg).get(name)
+    if r is not None and len(r) == 4 and name in regs:
+        return tuple(map(int, r))
     if name in regs:
         r = regs[name]
         if len(r) != 4:
@@ -60,7 +160,30 @@ def _get_region_coords(cfg: dict, name: str) -> Tuple[int, int, int, int]:
     raise KeyError(f"Region '{name}' not found in config.json (REGIONS)")
 
 
+def _bus_frame() -> Optional[np.ndarray]:
+    global _bus
+    try:
+        if _bus is None:
+            _bus = framebus.FrameBus.attach()
+        frame, ts, _ = _bus.read_latest()
+    except Exception:
+        _bus = None
+        return None
+    if frame is None or time.monotonic() - ts > BUS_MAX_AGE:
+        # publisher gone or restarted under the same name: re-attach next time
+        try:
+            _bus.close()
+        except Exception:
+            pass
+        _bus = None
+        return None
+    return frame
+
+
 def _capture_frame(camera_index: int = 0) -> np.ndarray:
+    frame = _bus_frame()
+    if frame is not None:
+        return frame
     cap = cv.VideoCapture(camera_index)
     if not cap.isOpened():
         raise RuntimeError(f"Camera {camera_index} not available")
@@ -76,27 +199,206 @@ def crop(frame: np.ndarray, rect: Tuple[int, int, int, int]) -> np.ndarray:
     return frame[y : y + h, x : x + w]
 
 
-def get_text(
-    name: str,
-    ocr_func: Optional[Callable[[np.ndarray], str]] = None,
-    frame: Optional[np.ndarray] = None,
-    camera_index: int = 0,
-) -> str:
-    """Return text from the named region.
+# ---------------------------------------------------------------------------
+# Shared grayscale of the region area
+# ---------------------------------------------------------------------------
 
-    If ocr_func is provided it will be called with the cropped BGR image and
-    should return a string. Otherwise the function will attempt to use
-    pytesseract (if installed) and raise a helpful error if not available.
+# (frame, box, origin, levels): the most recently analysed frame, the union
+# box it was converted for, the frame position of the gray image's top-left
+# pixel and its pyramid (native grayscale first, further levels added by
+# pyrDown on demand). Holding the frame keeps `is` reliable.
+_gray_cache: Optional[Tuple[np.ndarray, Tuple[int, int, int, int], Tuple[int, int], List[np.ndarray]]] = None
+
+
+def _union_box(cfg: dict, shape: Tuple[int, ...]) -> Tuple[int, int, int, int]:
+    """(x0, y0, x1, y1) covering every region plus its search margin, clipped to the frame."""
+    fh, fw = shape[:2]
+    x0, y0, x1, y1 = fw, fh, 0, 0
+    for name in cfg.get("REGIONS", {}):
+        try:
+            x, y, w, h = _get_region_coords(cfg, name)
+        except (KeyError, ValueError):
+            continue
+        m = max(int(_region_options(cfg, name).get("margin", 0)), 0)
+        m = m + TIGHT_MARGIN if m else 0
+        x0, y0 = min(x0, x - m), min(y0, y - m)
+        x1, y1 = max(x1, x + w + m), max(y1, y + h + m)
+    return max(0, x0), max(0, y0), min(fw, x1), min(fh, y1)
+
+
+def frame_gray(frame: np.ndarray, cfg: Optional[dict] = None,
+               level: int = 0) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Grayscale of the area covering all regions, converted once per frame.
+
+    Returns (gray, (x0, y0)) where (x0, y0) is the frame position of gray's
+    top-left pixel. The conversion happens on first use and is reused for
+    every further region of the same frame object, so frames must not be
+    modified in place after they were analysed (copies from the camera,
+    the frame bus and Server.get_frame never are).
+
+    level > 0 returns that level of the image pyramid built from the same
+    gray image (each level halves the size, pixel (i, j) of level k covers
+    frame pixel (x0 + i * 2**k, y0 + j * 2**k)); levels are computed once per
+    frame as well.
     """
-    cfg = _load_config()
-    name_key = _normalize_name(name)
-    region = _get_region_coords(cfg, name_key)
+    global _gray_cache
+    cached = _gray_cache
+    if frame.ndim == 2:
+        box = (0, 0, frame.shape[1], frame.shape[0])
+    else:
+        box = _union_box(cfg if cfg is not None else _load_config(), frame.shape)
+    if cached is None or cached[0] is not frame or cached[1] != box:
+        x0, y0, x1, y1 = box
+        if frame.ndim == 2:
+            gray, origin = frame, (0, 0)
+        elif x1 <= x0 or y1 <= y0:
+            gray, origin = cv.cvtColor(frame, cv.COLOR_BGR2GRAY), (0, 0)
+        else:
+            gray, origin = cv.cvtColor(frame[y0:y1, x0:x1], cv.COLOR_BGR2GRAY), (x0, y0)
+        cached = _gray_cache = (frame, box, origin, [gray])
+    levels = cached[3]
+    if len(levels) <= level:
+        # extend a copy so concurrent readers never see a half-built list
+        levels = list(levels)
+        while len(levels) <= level:
+            levels.append(cv.pyrDown(levels[-1]))
+        cached = _gray_cache = cached[:3] + (levels,)
+    return levels[level], cached[2]
 
-    if frame is None:
-        frame = _capture_frame(camera_index)
 
-    img = crop(frame, region)
+def _level_crop(frame: np.ndarray, rect: Tuple[int, int, int, int], cfg: Optional[dict],
+                level: int) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Gray crop of rect at a pyramid level and the frame position of its top-left pixel.
+
+    The crop is ceil(w / 2**level) x ceil(h / 2**level) pixels, the size the
+    template pyramid reduces a (w, h) template to. Its origin is snapped to
+    the level's pixel grid, so it may lie up to 2**level - 1 pixels left of
+    and above (x, y).
+    """
+    gray, (gx, gy) = frame_gray(frame, cfg, level)
+    x, y, w, h = rect
+    lx, ly = (x - gx) >> level, (y - gy) >> level
+    lw, lh = -(-w >> level), -(-h >> level)
+    if x >= gx and y >= gy and lx + lw <= gray.shape[1] and ly + lh <= gray.shape[0]:
+        return gray[ly : ly + lh, lx : lx + lw], (gx + (lx << level), gy + (ly << level))
+    img = crop(frame, rect)
+    if img.ndim == 3:
+        img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+    for _ in range(level):
+        img = cv.pyrDown(img)
+    return img, (x, y)
+
+
+def gray_crop(frame: np.ndarray, rect: Tuple[int, int, int, int],
+              cfg: Optional[dict] = None, level: int = 0) -> np.ndarray:
+    """Grayscale crop of rect; a view into frame_gray() when rect lies inside it.
+
+    With level > 0 the crop comes from that level of the shared pyramid and
+    is reduced by 2**level in each direction.
+    """
+    return _level_crop(frame, rect, cfg, level)[0]
+
+
+class OcrPipeline:
+    """Preprocessing chain that turns a BGR crop into a clean binary image.
+
+    Built once per region from REGION_OPTIONS[<Name>]["ocr"]:
+      - scale: fixed upscale factor (default 1)
+      - threshold: "otsu", "adaptive" or None (keep gray)
+      - block, C: adaptive threshold block size and constant
+      - gamma: optional contrast curve, applied through a precomputed LUT
+      - invert: True for light text on a dark background
+      - pad: white border in pixels around the text (default 8)
+      - psm, whitelist: passed on to tesseract
+    Intermediate buffers are reused between calls for the same crop size;
+    the lock keeps concurrent callers from sharing them.
+    """
+
+    def __init__(self, opts: Optional[dict] = None):
+        opts = dict(opts or {})
+        self.scale = float(opts.get("scale", 1.0))
+        self.threshold = opts.get("threshold")
+        block = int(opts.get("block", 31))
+        self.block = block if block % 2 else block + 1
+        self.c = float(opts.get("C", 5))
+        self.invert = bool(opts.get("invert", False))
+        self.pad = int(opts.get("pad", 8))
+        gamma = opts.get("gamma")
+        self.lut = None
+        if gamma:
+            x = np.arange(256, dtype=np.float32) / 255.0
+            self.lut = np.clip(np.power(x, float(gamma)) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+        thresh_type = cv.THRESH_BINARY_INV if self.invert else cv.THRESH_BINARY
+        self._thresh_flags = thresh_type | cv.THRESH_OTSU
+        self._adaptive_type = thresh_type
+        parts = []
+        if opts.get("psm") is not None:
+            parts.append(f"--psm {int(opts['psm'])}")
+        if opts.get("whitelist"):
+            parts.append(f"-c tessedit_char_whitelist={opts['whitelist']}")
+        self.tesseract_config = " ".join(parts)
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._lock = threading.Lock()
 
+    def _allocate(self, shape: Tuple[int, ...]) -> None:
+        h, w = shape[:2]
+        sw, sh = max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale)))
+        self._size = (sw, sh)
+        self._gray = np.empty((h, w), np.uint8)
+        self._scaled = np.empty((sh, sw), np.uint8) if (sw, sh) != (w, h) else self._gray
+        p = self.pad
+        # text is always dark on white by the end, so the border is white
+        self._out = np.full((sh + 2 * p, sw + 2 * p), 255, np.uint8)
+        self._body = self._out[p:p + sh, p:p + sw]
+        self._shape = shape
+
+    def run(self, img: np.ndarray) -> np.ndarray:
+        """Return the preprocessed image; valid until the next run() call."""
+        if img.shape != self._shape:
+            self._allocate(img.shape)
+        if img.ndim == 3:
+            cv.cvtColor(img, cv.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            np.copyto(self._gray, img)
+        if self.lut is not None:
+            cv.LUT(self._gray, self.lut, dst=self._gray)
+        if self._scaled is not self._gray:
+            cv.resize(self._gray, self._size, dst=self._scaled, interpolation=cv.INTER_CUBIC)
+        if self.threshold == "otsu":
+            cv.threshold(self._scaled, 0, 255, self._thresh_flags, dst=self._body)
+        elif self.threshold == "adaptive":
+            cv.adaptiveThreshold(self._scaled, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 self._adaptive_type, self.block, self.c, dst=self._body)
+        elif self.invert:
+            cv.bitwise_not(self._scaled, dst=self._body)
+        else:
+            np.copyto(self._body, self._scaled)
+        return self._out
+
+
+# region -> (options it was built from, pipeline)
+_ocr_pipelines: Dict[str, Tuple[dict, OcrPipeline]] = {}
+
+
+def _ocr_pipeline(name_key: str, opts: Optional[dict]) -> Optional[OcrPipeline]:
+    if not opts:
+        return None
+    cached = _ocr_pipelines.get(name_key)
+    if cached is None or cached[0] != opts:
+        cached = _ocr_pipelines[name_key] = (dict(opts), OcrPipeline(opts))
+    return cached[1]
+
+
+def _ocr_image(
+    img: np.ndarray,
+    ocr_func: Optional[Callable[[np.ndarray], str]] = None,
+    pipeline: Optional[OcrPipeline] = None,
+) -> str:
+    """Run ocr_func (or pytesseract) on a BGR crop.
+
+    ocr_func always receives the raw BGR crop; the preprocessing pipeline is
+    only applied on the way to tesseract.
+    """
     if ocr_func is not None:
         return ocr_func(img)
 
@@ -110,6 +412,14 @@ def get_text(
             "Install pytesseract or pass an ocr_func(image)->str."
         ) from e
 
+    if pipeline is not None:
+        with pipeline._lock:
+            # fromarray shares memory with the pipeline's output buffer, which
+            # the next caller overwrites while tesseract may still read it
+            pil = Image.fromarray(pipeline.run(img).copy())
+        text = pytesseract.image_to_string(pil, config=pipeline.tesseract_config)
+        return text.strip()
+
     # convert BGR -> RGB -> PIL
     rgb = cv.cvtColor(img, cv.COLOR_BGR2RGB)
     pil = Image.fromarray(rgb)
@@ -117,19 +427,158 @@ def get_text(
     return text.strip()
 
 
-def check(
+# ---------------------------------------------------------------------------
+# Glyph recognizer for numeric regions
+# ---------------------------------------------------------------------------
+
+GLYPH_SIZE = (12, 16)  # (w, h) every glyph is normalized to
+GLYPH_MIN_CONFIDENCE = 0.75
+
+
+def glyph_path(name_key: str) -> str:
+    return os.path.join(TEMPLATE_DIR, f"glyphs_{name_key}.npz")
+
+
+def glyph_mask(img: np.ndarray) -> np.ndarray:
+    """Binary mask (uint8 0/1) with text pixels set, whatever the polarity."""
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    _, mask = cv.threshold(gray, 0, 1, cv.THRESH_BINARY | cv.THRESH_OTSU)
+    # text is the minority class
+    if np.count_nonzero(mask) * 2 > mask.size:
+        mask ^= 1
+    return mask
+
+
+def segment_glyphs(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Split a glyph mask into per-character boxes (x, y, w, h), left to right.
+
+    Components that overlap horizontally (e.g. the dot of an "i") are merged;
+    specks smaller than a fifth of the tallest glyph are dropped.
+    """
+    n, _, stats, _ = cv.connectedComponentsWithStats(mask, connectivity=8)
+    boxes = [tuple(int(v) for v in stats[i, :4]) for i in range(1, n)]
+    if not boxes:
+        return []
+    tallest = max(b[3] for b in boxes)
+    boxes = sorted(b for b in boxes if max(b[2], b[3]) * 5 >= tallest)
+    merged: List[Tuple[int, int, int, int]] = []
+    for x, y, w, h in boxes:
+        if merged:
+            mx, my, mw, mh = merged[-1]
+            overlap = min(mx + mw, x + w) - max(mx, x)
+            if overlap * 2 >= min(mw, w):
+                nx, ny = min(mx, x), min(my, y)
+                merged[-1] = (nx, ny, max(mx + mw, x + w) - nx, max(my + mh, y + h) - ny)
+                continue
+        merged.append((x, y, w, h))
+    return merged
+
+
+def glyph_vectors(mask: np.ndarray, boxes: Sequence[Tuple[int, int, int, int]]) -> np.ndarray:
+    """Normalized (N, GLYPH_SIZE) feature rows; row dot products are NCC scores."""
+    gw, gh = GLYPH_SIZE
+    out = np.empty((len(boxes), gw * gh), np.float32)
+    for i, (x, y, w, h) in enumerate(boxes):
+        g = cv.resize(mask[y:y + h, x:x + w].astype(np.float32), GLYPH_SIZE,
+                      interpolation=cv.INTER_AREA)
+        out[i] = g.ravel()
+    out -= out.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    out /= np.maximum(norms, 1e-6)
+    return out
+
+
+# region -> (mtime, labels, vectors)
+_glyph_sets: Dict[str, Tuple[float, np.ndarray, np.ndarray]] = {}
+
+
+def _load_glyphs(name_key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    path = glyph_path(name_key)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _glyph_sets.get(name_key)
+    if cached is None or cached[0] != mtime:
+        with np.load(path) as data:
+            cached = (mtime, data["labels"], np.ascontiguousarray(data["vectors"], np.float32))
+        _glyph_sets[name_key] = cached
+    return cached[1], cached[2]
+
+
+def recognize_glyphs(name_key: str, img: np.ndarray) -> Tuple[str, float]:
+    """Read a crop with the learned glyph set of a region.
+
+    Returns (text, confidence). Confidence is the lowest per-glyph NCC score,
+    0.0 when no glyphs are learned or nothing was segmented.
+    """
+    glyphs = _load_glyphs(name_key)
+    if glyphs is None:
+        return "", 0.0
+    labels, vectors = glyphs
+    mask = glyph_mask(img)
+    boxes = segment_glyphs(mask)
+    if not boxes:
+        return "", 0.0
+    scores = glyph_vectors(mask, boxes) @ vectors.T  # (N glyphs, K samples)
+    best = scores.argmax(axis=1)
+    text = "".join(str(labels[i]) for i in best)
+    return text, float(scores[np.arange(len(best)), best].min())
+
+
+def recognize(
     name: str,
-    threshold: float = 0.85,
     frame: Optional[np.ndarray] = None,
     camera_index: int = 0,
-) -> bool:
-    """Check if the current region matches the stored template image.
+) -> Tuple[str, float]:
+    """Read the named region with its glyph set only (no OCR engine)."""
+    cfg = _load_config()
+    name_key = _normalize_name(name)
+    region = _get_region_coords(cfg, name_key)
+    if frame is None:
+        frame = _capture_frame(camera_index)
+    return recognize_glyphs(name_key, gray_crop(frame, region, cfg))
+
+
+def get_text(
+    name: str,
+    ocr_func: Optional[Callable[[np.ndarray], str]] = None,
+    frame: Optional[np.ndarray] = None,
+    camera_index: int = 0,
+) -> str:
+    """Return text from the named region.
+
+    If ocr_func is provided it will be called with the cropped BGR image and
+    should return a string. Otherwise the function will attempt to use
+    pytesseract (if installed) and raise a helpful error if not available.
+    With REGION_OPTIONS[<Name>]["ocr"] set, the crop is run through an
+    OcrPipeline first so tesseract gets a small clean binary image.
 
-    Returns True if the normalized template matching score is >= threshold.
+    With REGION_OPTIONS[<Name>]["recognizer"] == "glyph" the glyphs learned by
+    `calibrate.py` are tried first; OCR only runs when their confidence is
+    below REGION_OPTIONS[<Name>]["glyph_confidence"] (default 0.75).
     """
     cfg = _load_config()
     name_key = _normalize_name(name)
+    region = _get_region_coords(cfg, name_key)
+    opts = _region_options(cfg, name_key)
+    pipeline = _ocr_pipeline(name_key, opts.get("ocr"))
+
+    if frame is None:
+        frame = _capture_frame(camera_index)
+
+    img = crop(frame, region)
+    if ocr_func is None and opts.get("recognizer") == "glyph":
+        text, conf = recognize_glyphs(name_key, gray_crop(frame, region, cfg))
+        if text and conf >= float(opts.get("glyph_confidence", GLYPH_MIN_CONFIDENCE)):
+            journal.log("ocr", name=name_key, text=text, engine="glyph", confidence=round(conf, 3))
+            return text
+    text = _ocr_image(img, ocr_func, pipeline)
+    journal.log("ocr", name=name_key, text=text, engine="ocr")
+    return text
+
 
+def _load_template(name_key: str) -> np.ndarray:
     # we expect templates saved as templates/region_<Name>.png by calibrate.py
     tmpl_path = os.path.join(TEMPLATE_DIR, f"region_{name_key}.png")
     if not os.path.exists(tmpl_path):
@@ -138,32 +587,864 @@ def check(
     template = cv.imread(tmpl_path, cv.IMREAD_COLOR)
     if template is None:
         raise RuntimeError(f"Failed to load template image: {tmpl_path}")
+    return template
+
+
+# (name, mtime, w, h) -> gray template pyramid, finest level first
+_pyramid_cache: Dict[Tuple[str, float, int, int], List[np.ndarray]] = {}
+
+
+def _template_pyramid(name_key: str, size: Tuple[int, int], levels: int) -> List[np.ndarray]:
+    tmpl_path = os.path.join(TEMPLATE_DIR, f"region_{name_key}.png")
+    try:
+        mtime = os.path.getmtime(tmpl_path)
+    except OSError:
+        mtime = 0.0
+    key = (name_key, mtime, size[0], size[1])
+    pyr = _pyramid_cache.get(key)
+    if pyr is None or len(pyr) <= levels:
+        template = _load_template(name_key)
+        if template.shape[1::-1] != size:
+            template = cv.resize(template, size, interpolation=cv.INTER_AREA)
+        pyr = [cv.cvtColor(template, cv.COLOR_BGR2GRAY)]
+        while len(pyr) <= max(levels, MAX_PYRAMID_LEVELS):
+            pyr.append(cv.pyrDown(pyr[-1]))
+        for k in [k for k in _pyramid_cache if k[0] == name_key]:
+            del _pyramid_cache[k]
+        _pyramid_cache[key] = pyr
+    return pyr
+
+
+class Matcher(NamedTuple):
+    """A region similarity measure; higher scores mean more similar.
+
+    prepare() turns the gray template (already resized to the region size)
+    into whatever reference score() needs; its result is cached per template.
+    """
+    prepare: Callable[[np.ndarray], object]
+    score: Callable[[np.ndarray, object], float]
+
+
+MATCHERS: Dict[str, Matcher] = {}
+DEFAULT_MATCHER = "ncc"
+
+
+def register_matcher(
+    name: str,
+    prepare: Callable[[np.ndarray], object],
+    score: Callable[[np.ndarray, object], float],
+) -> None:
+    """Register a matcher usable as REGION_OPTIONS[<Name>]["matcher"]."""
+    MATCHERS[name] = Matcher(prepare, score)
+
+
+def _ncc_score(gray: np.ndarray, ref: object) -> float:
+    res = cv.matchTemplate(gray, ref, cv.TM_CCOEFF_NORMED)
+    min_val, max_val, min_loc, max_loc = cv.minMaxLoc(res)
+    return float(max_val)
+
+
+def _phash(gray: np.ndarray) -> np.ndarray:
+    small = cv.resize(gray, (32, 32), interpolation=cv.INTER_AREA).astype(np.float32)
+    low = cv.dct(small)[:8, :8].ravel()
+    return low > np.median(low[1:])
+
+
+def _phash_score(gray: np.ndarray, ref: object) -> float:
+    return 1.0 - np.count_nonzero(_phash(gray) != ref) / 64.0
+
+
+def _hist(gray: np.ndarray) -> np.ndarray:
+    h = cv.calcHist([gray], [0], None, [32], [0, 256])
+    return cv.normalize(h, h).ravel()
+
+
+def _hist_score(gray: np.ndarray, ref: object) -> float:
+    return float(cv.compareHist(_hist(gray), ref, cv.HISTCMP_CORREL))
+
+
+def _small(gray: np.ndarray) -> np.ndarray:
+    return cv.resize(gray, (16, 16), interpolation=cv.INTER_AREA).astype(np.float32)
+
+
+def _meandiff_score(gray: np.ndarray, ref: object) -> float:
+    return 1.0 - float(np.mean(np.abs(_small(gray) - ref))) / 255.0
+
+
+register_matcher("ncc", lambda g: g, _ncc_score)
+register_matcher("phash", _phash, _phash_score)
+register_matcher("hist", _hist, _hist_score)
+register_matcher("meandiff", _small, _meandiff_score)
+
+
+# (name, matcher, level) -> (template gray it was prepared from, prepared reference)
+_matcher_refs: Dict[Tuple[str, str, int], Tuple[np.ndarray, object]] = {}
+
+
+def _score_region(name_key: str, img: np.ndarray, matcher: str = DEFAULT_MATCHER,
+                  level: int = 0, size: Optional[Tuple[int, int]] = None) -> float:
+    """Score a BGR or gray crop against the region template with the given matcher.
+
+    For level > 0, img is a crop of that pyramid level (see gray_crop) and
+    size the region's (w, h) at native resolution; the template is reduced
+    along the same pyramid.
+    """
+    m = MATCHERS.get(matcher)
+    if m is None:
+        raise KeyError(f"Unknown matcher '{matcher}' (known: {', '.join(MATCHERS)})")
+    ih, iw = img.shape[:2]
+    tmpl = _template_pyramid(name_key, size or (iw, ih), level)[level]
+    cached = _matcher_refs.get((name_key, matcher, level))
+    if cached is None or cached[0] is not tmpl:
+        cached = _matcher_refs[(name_key, matcher, level)] = (tmpl, m.prepare(tmpl))
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return m.score(gray, cached[1])
+
+
+class MatchResult(NamedTuple):
+    """Best match of a region template inside its search window."""
+    score: float
+    loc: Tuple[int, int]  # top-left corner of the match in frame coordinates
+    offset: Tuple[int, int]  # shift relative to the calibrated rectangle
+
+
+# last accepted hit per region (top-left in frame coordinates)
+_last_hits: Dict[str, Tuple[int, int]] = {}
+
+
+def _clip_window(frame: np.ndarray, x: int, y: int, w: int, h: int, m: int):
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(0, x - m), max(0, y - m)
+    x1, y1 = min(fw, x + w + m), min(fh, y + h + m)
+    return x0, y0, frame[y0:y1, x0:x1]
+
+
+def _search(gray: np.ndarray, pyr: List[np.ndarray], levels: int) -> Tuple[float, Tuple[int, int]]:
+    """Coarse-to-fine NCC search of pyr[0] inside gray; returns (score, (x, y))."""
+    imgs = [gray]
+    for _ in range(levels):
+        imgs.append(cv.pyrDown(imgs[-1]))
+
+    res = cv.matchTemplate(imgs[levels], pyr[levels], cv.TM_CCOEFF_NORMED)
+    _, score, _, (bx, by) = cv.minMaxLoc(res)
+    for lvl in range(levels - 1, -1, -1):
+        img, tmpl = imgs[lvl], pyr[lvl]
+        th, tw = tmpl.shape[:2]
+        # refine in a +-2px neighbourhood of the upsampled coarse hit
+        cx, cy = bx * 2, by * 2
+        x0, y0 = max(0, cx - 2), max(0, cy - 2)
+        x1 = min(img.shape[1], cx + 2 + tw)
+        y1 = min(img.shape[0], cy + 2 + th)
+        if x1 - x0 < tw or y1 - y0 < th:
+            x0, y0 = max(0, x1 - tw - 4), max(0, y1 - th - 4)
+        res = cv.matchTemplate(img[y0:y1, x0:x1], tmpl, cv.TM_CCOEFF_NORMED)
+        _, score, _, (rx, ry) = cv.minMaxLoc(res)
+        bx, by = x0 + rx, y0 + ry
+    return float(score), (bx, by)
+
+
+def _pyramid_levels(w: int, h: int, margin: int) -> int:
+    levels = 0
+    while (levels < MAX_PYRAMID_LEVELS
+           and min(w, h) >> (levels + 1) >= MIN_PYRAMID_SIZE
+           and margin >> (levels + 1) >= 2):
+        levels += 1
+    return levels
+
+
+def _match_in_window(frame, name_key, rect, margin, cfg=None, level=0) -> MatchResult:
+    x, y, w, h = rect
+    levels = _pyramid_levels(-(-w >> level), -(-h >> level), margin >> level)
+    # the search starts at `level` of the template pyramid, like the frame
+    pyr = _template_pyramid(name_key, (w, h), level + levels)[level:]
+    x0, y0, win = _clip_window(frame, x, y, w, h, margin)
+    if win.shape[0] < h or win.shape[1] < w:
+        return MatchResult(-1.0, (x, y), (0, 0))
+    gray, (ox, oy) = _level_crop(frame, (x0, y0, win.shape[1], win.shape[0]), cfg, level)
+    score, (bx, by) = _search(gray, pyr, levels)
+    bx, by = ox + (bx << level), oy + (by << level)
+    return MatchResult(score, (bx, by), (bx - x, by - y))
+
+
+def match(
+    name: str,
+    frame: Optional[np.ndarray] = None,
+    camera_index: int = 0,
+    margin: Optional[int] = None,
+    threshold: Optional[float] = None,
+) -> MatchResult:
+    """Locate the region template near its calibrated position.
 
+    margin: search margin in pixels around the calibrated rectangle. Defaults
+    to REGION_OPTIONS[<Name>]["margin"] in config.json, or 0 (compare the
+    calibrated rectangle only, as before).
+
+    The score comes from REGION_OPTIONS[<Name>]["matcher"] (see MATCHERS,
+    default "ncc"). Location search is NCC-only, so the cheaper matchers
+    always compare the calibrated rectangle.
+
+    With a margin the search runs coarse-to-fine on an image pyramid. The
+    last accepted hit is remembered per region; the next call first searches
+    a tight window around it and only falls back to the full margin when
+    that does not reach `threshold`.
+
+    Regions with REGION_OPTIONS[<Name>]["analysis_scale"] below 1 are
+    compared on a reduced level of the shared frame pyramid (see
+    analysis_scale()); locations are mapped back to frame coordinates.
+
+    Every score is recorded in the region's ScoreHistory.
+    """
+    cfg = _load_config()
+    name_key = _normalize_name(name)
     region = _get_region_coords(cfg, name_key)
+    if margin is None:
+        margin = int(_region_options(cfg, name_key).get("margin", 0))
 
     if frame is None:
         frame = _capture_frame(camera_index)
 
-    img = crop(frame, region)
+    level = _analysis_level(cfg, name_key, threshold)
+    result = _locate(frame, cfg, name_key, region, margin, threshold, level)
+    score_history(name_key).add(result.score)
+    journal.log("region", name=name_key, score=round(result.score, 4),
+                offset=list(result.offset), threshold=threshold, scale=ANALYSIS_SCALES[level])
+    return result
 
-    # If sizes differ, resize template to match captured region for direct comparison
-    th, tw = template.shape[:2]
-    ih, iw = img.shape[:2]
-    tmpl = template
-    if (th, tw) != (ih, iw):
+
+def _score_at(frame, cfg, name_key, region, matcher, level) -> MatchResult:
+    """Compare the calibrated rectangle only."""
+    x, y, w, h = region
+    score = _score_region(name_key, gray_crop(frame, region, cfg, level), matcher, level, (w, h))
+    return MatchResult(score, (x, y), (0, 0))
+
+
+def _locate(frame, cfg, name_key, region, margin, threshold, level=0) -> MatchResult:
+    x, y, w, h = region
+    matcher = _region_options(cfg, name_key).get("matcher", DEFAULT_MATCHER)
+    if margin <= 0 or matcher != "ncc":
+        return _score_at(frame, cfg, name_key, region, matcher, level)
+
+    best = None
+    last = _last_hits.get(name_key)
+    if last is not None and threshold is not None:
+        best = _match_in_window(frame, name_key, (last[0], last[1], w, h), TIGHT_MARGIN, cfg, level)
+        best = best._replace(offset=(best.loc[0] - x, best.loc[1] - y))
+        if best.score >= threshold and max(map(abs, best.offset)) <= margin:
+            _last_hits[name_key] = best.loc
+            return best
+
+    full = _match_in_window(frame, name_key, region, margin, cfg, level)
+    if best is None or full.score >= best.score:
+        best = full
+    if threshold is None or best.score >= threshold:
+        _last_hits[name_key] = best.loc
+    return best
+
+
+def check(
+    name: str,
+    threshold: Optional[float] = None,
+    frame: Optional[np.ndarray] = None,
+    camera_index: int = 0,
+    margin: Optional[int] = None,
+) -> bool:
+    """Check if the current region matches the stored template image.
+
+    Returns True if the matcher score is >= threshold. The threshold defaults
+    to REGION_OPTIONS[<Name>]["threshold"], or 0.85. See match() for the
+    optional search margin and matcher selection.
+    """
+    if threshold is None:
+        opts = _region_options(_load_config(), _normalize_name(name))
+        threshold = float(opts.get("threshold", DEFAULT_THRESHOLD))
+    return match(name, frame, camera_index, margin, threshold).score >= float(threshold)
+
+
+# ---------------------------------------------------------------------------
+# Reduced-resolution analysis
+# ---------------------------------------------------------------------------
+
+def _scale_level(scale: float) -> int:
+    """Pyramid level of the coarsest analysis scale that is not below `scale`."""
+    level = 0
+    while level < MAX_PYRAMID_LEVELS and ANALYSIS_SCALES[level + 1] >= float(scale) - 1e-9:
+        level += 1
+    return level
+
+
+def _scale_key(level: int) -> str:
+    # keys of REGION_OPTIONS[<Name>]["scale_scores"]: "1", "0.5", "0.25", ...
+    return f"{ANALYSIS_SCALES[level]:g}"
+
+
+def _analysis_level(cfg: dict, name_key: str, threshold: Optional[float] = None) -> int:
+    opts = _region_options(cfg, name_key)
+    coarsest = _scale_level(opts.get("analysis_scale", 1.0))
+    scores = opts.get("scale_scores")
+    # unmeasured (e.g. right after a template was saved): stay at native resolution
+    if coarsest == 0 or not isinstance(scores, dict):
+        return 0
+    if threshold is None:
+        threshold = float(opts.get("threshold", DEFAULT_THRESHOLD))
+    need = float(opts.get("min_separation", MIN_SCALE_SEPARATION))
+    for level in range(coarsest, 0, -1):
+        rec = scores.get(_scale_key(level))
+        if rec and rec[0] - rec[1] >= need and rec[1] < threshold <= rec[0]:
+            return level
+    return 0
+
+
+def analysis_scale(name: str, threshold: Optional[float] = None) -> float:
+    """Scale match()/check() compare a region at (1.0 = native pixels).
+
+    REGION_OPTIONS[<Name>]["analysis_scale"] (1, 0.5, 0.25 or 0.125; other
+    values snap to the next finer one) is the coarsest scale allowed. Once
+    calibration has recorded scores per scale (REGION_OPTIONS[<Name>]
+    ["scale_scores"], see scale_scores()), the coarsest allowed scale is
+    used at which the positives still beat the negatives by min_separation
+    (default 0.05) with the threshold between them; native resolution if
+    none does. Without recorded scores for the current template (saving a
+    template drops them) regions are matched at native resolution.
+    """
+    cfg = _load_config()
+    return ANALYSIS_SCALES[_analysis_level(cfg, _normalize_name(name), threshold)]
+
+
+def _score_once(frame: np.ndarray, cfg: dict, name_key: str, level: int = 0,
+                margin: Optional[int] = None) -> float:
+    """Score a region like match() does, without history, last hit or journal."""
+    region = _get_region_coords(cfg, name_key)
+    opts = _region_options(cfg, name_key)
+    if margin is None:
+        margin = int(opts.get("margin", 0))
+    matcher = opts.get("matcher", DEFAULT_MATCHER)
+    if margin <= 0 or matcher != "ncc":
+        return _score_at(frame, cfg, name_key, region, matcher, level).score
+    return _match_in_window(frame, name_key, region, margin, cfg, level).score
+
+
+def scale_scores(
+    name: str,
+    positives: Sequence[np.ndarray],
+    negatives: Sequence[np.ndarray],
+    scales: Sequence[float] = ANALYSIS_SCALES,
+    margin: Optional[int] = None,
+) -> Dict[str, Tuple[float, float]]:
+    """Lowest positive and highest negative score of a region per analysis scale.
+
+    positives/negatives are full frames in which the region does / does not
+    show its template. Scores are computed like match() does with the
+    region's matcher and margin, without touching the score history or the
+    last accepted hit. The result is what calibration stores as
+    REGION_OPTIONS[<Name>]["scale_scores"].
+    """
+    cfg = _load_config()
+    name_key = _normalize_name(name)
+    out = {}
+    for level in sorted({_scale_level(s) for s in scales}):
+        ps = [_score_once(f, cfg, name_key, level, margin) for f in positives]
+        ns = [_score_once(f, cfg, name_key, level, margin) for f in negatives]
+        out[_scale_key(level)] = (round(min(ps), 4), round(max(ns), 4))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Score history and threshold tuning
+# ---------------------------------------------------------------------------
+
+HISTORY_SIZE = 1024
+STATE_UNKNOWN, STATE_NEGATIVE, STATE_POSITIVE = -1, 0, 1
+# one memory-mapped ring per region, shared by every process: scores are
+# recorded where match() runs (e.g. an automation script) and confirmed or
+# tuned through Server.py
+HISTORY_DIR = "score_history"
+# file layout: sample count (u8, padded to 16 bytes), then the records
+_HISTORY_HEADER = 16
+_HISTORY_DTYPE = np.dtype([("ts", "<f8"), ("score", "<f4"), ("state", "i1"), ("_pad", "u1", 3)])
+
+
+class TuneResult(NamedTuple):
+    """Threshold picked from a region's confirmed score history."""
+    threshold: float
+    errors: int  # confirmed samples the threshold still gets wrong
+    separation: float  # gap between the scores on either side of it
+    positives: int
+    negatives: int
+
+
+class ScoreHistory:
+    """Fixed-size ring of (timestamp, score, confirmed state) for one region.
+
+    Scores are appended by match()/check() with state STATE_UNKNOWN; once
+    the caller knows what the screen really showed it labels them with
+    confirm(). The arrays are preallocated, so recording never allocates.
+
+    With `path` the ring lives in a memory-mapped file that every process
+    opening the same path shares (guarded by a lockf lock); a file of a
+    different ring size is started afresh. Timestamps are time.monotonic(),
+    which on Linux is one clock for all processes.
+    """
+
+    def __init__(self, size: int = HISTORY_SIZE, path: Optional[str] = None):
+        self.size = int(size)
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        if path is None:
+            self._count = np.zeros(1, np.uint64)
+            rec = np.zeros(self.size, _HISTORY_DTYPE)
+        else:
+            nbytes = _HISTORY_HEADER + self.size * _HISTORY_DTYPE.itemsize
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            with self._locked():
+                if os.fstat(self._fd).st_size != nbytes:
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, nbytes)
+            self._map = mmap.mmap(self._fd, nbytes)
+            self._count = np.frombuffer(self._map, np.uint64, 1)
+            rec = np.frombuffer(self._map, _HISTORY_DTYPE, self.size, _HISTORY_HEADER)
+        self.ts, self.scores, self.states = rec["ts"], rec["score"], rec["state"]
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    @contextmanager
+    def _locked(self):
+        # lockf locks belong to the process, the thread lock covers this one
+        with self._lock:
+            if self._fd is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def add(self, score: float, ts: Optional[float] = None) -> None:
+        with self._locked():
+            i = self.count % self.size
+            self.ts[i] = time.monotonic() if ts is None else ts
+            self.scores[i] = score
+            self.states[i] = STATE_UNKNOWN
+            self._count[0] += 1
+
+    def _valid(self) -> slice:
+        return slice(0, min(self.count, self.size))
+
+    def confirm(self, matched: bool, since: Optional[float] = None,
+                until: Optional[float] = None) -> int:
+        """Label unconfirmed scores recorded in [since, until] (default: all).
+
+        Returns the number of samples labelled.
+        """
+        with self._locked():
+            v = self._valid()
+            sel = self.states[v] == STATE_UNKNOWN
+            if since is not None:
+                sel &= self.ts[v] >= since
+            if until is not None:
+                sel &= self.ts[v] <= until
+            self.states[v][sel] = STATE_POSITIVE if matched else STATE_NEGATIVE
+            return int(np.count_nonzero(sel))
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copies of ts/scores/states in chronological order."""
+        with self._locked():
+            n = min(self.count, self.size)
+            start = self.count % self.size if self.count > self.size else 0
+            idx = (np.arange(n) + start) % self.size
+            return {"ts": self.ts[idx], "scores": self.scores[idx], "states": self.states[idx]}
+
+    def tune(self) -> Optional[TuneResult]:
+        """Threshold with the fewest confirmed errors and, among those, the widest gap.
+
+        Returns None until there is at least one positive and one negative.
+        """
+        snap = self.snapshot()
+        known = snap["states"] != STATE_UNKNOWN
+        scores = snap["scores"][known].astype(np.float64)
+        labels = snap["states"][known] == STATE_POSITIVE
+        n_pos = int(np.count_nonzero(labels))
+        n_neg = len(labels) - n_pos
+        if n_pos == 0 or n_neg == 0:
+            return None
+        order = np.argsort(scores, kind="stable")
+        s, y = scores[order], labels[order]
+        # split k: everything at index >= k is called a match
+        fn = np.concatenate(([0], np.cumsum(y)))
+        fp = n_neg - np.concatenate(([0], np.cumsum(~y)))
+        errors = fn + fp
+        lo = np.concatenate(([s[0] - 0.05], s))
+        hi = np.concatenate((s, [s[-1] + 0.05]))
+        gaps = hi - lo
+        best = np.flatnonzero(errors == errors.min())
+        k = int(best[np.argmax(gaps[best])])
+        return TuneResult(float((lo[k] + hi[k]) / 2.0), int(errors[k]), float(gaps[k]), n_pos, n_neg)
+
+
+_histories: Dict[str, ScoreHistory] = {}
+_histories_lock = threading.Lock()
+
+
+def score_history(name: str) -> ScoreHistory:
+    """The ScoreHistory of a region (HISTORY_DIR/<Name>.bin, opened on first use)."""
+    name_key = _normalize_name(name)
+    h = _histories.get(name_key)
+    if h is None:
+        with _histories_lock:
+            h = _histories.get(name_key)
+            if h is None:
+                h = _histories[name_key] = ScoreHistory(
+                    path=os.path.join(HISTORY_DIR, f"{name_key}.bin"))
+    return h
+
+
+def confirm(name: str, matched: bool, since: Optional[float] = None,
+            until: Optional[float] = None) -> int:
+    """Record what a region really showed for the scores taken in [since, until]."""
+    return score_history(name).confirm(matched, since, until)
+
+
+def tune_threshold(name: str) -> Optional[TuneResult]:
+    """Best threshold for a region from its confirmed score history (or None)."""
+    return score_history(name).tune()
+
+
+# ---------------------------------------------------------------------------
+# Multi-state classification
+# ---------------------------------------------------------------------------
+
+class StateResult(NamedTuple):
+    """Outcome of classify(): winning state, its score and lead over the runner-up."""
+    label: Optional[str]
+    score: float
+    margin: float
+    scores: Dict[str, float]
+
+
+def state_dir(name_key: str) -> str:
+    return os.path.join(TEMPLATE_DIR, "states", name_key)
+
+
+# region -> (dir signature, size, labels, (K, w*h) normalized stack)
+_state_stacks: Dict[str, Tuple[tuple, Tuple[int, int], List[str], np.ndarray]] = {}
+
+
+def _normalized_rows(rows: np.ndarray) -> np.ndarray:
+    rows -= rows.mean(axis=1, keepdims=True)
+    rows /= np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-6)
+    return rows
+
+
+def _state_stack(name_key: str, size: Tuple[int, int]) -> Tuple[List[str], np.ndarray]:
+    d = state_dir(name_key)
+    try:
+        files = sorted(f for f in os.listdir(d) if f.lower().endswith(".png"))
+    except OSError:
+        files = []
+    if not files:
+        raise FileNotFoundError(f"No state templates in {d}. Save some with calibrate.py first.")
+    sig = tuple((f, os.path.getmtime(os.path.join(d, f))) for f in files)
+    cached = _state_stacks.get(name_key)
+    if cached is not None and cached[0] == sig and cached[1] == size:
+        return cached[2], cached[3]
+
+    w, h = size
+    stack = np.empty((len(files), w * h), np.float32)
+    for i, f in enumerate(files):
+        img = cv.imread(os.path.join(d, f), cv.IMREAD_GRAYSCALE)
+        if img is None:
+            raise RuntimeError(f"Failed to load state template: {os.path.join(d, f)}")
+        if img.shape[1::-1] != size:
+            img = cv.resize(img, size, interpolation=cv.INTER_AREA)
+        stack[i] = img.ravel()
+    labels = [os.path.splitext(f)[0] for f in files]
+    stack = _normalized_rows(stack)
+    _state_stacks[name_key] = (sig, size, labels, stack)
+    return labels, stack
+
+
+def classify(
+    name: str,
+    frame: Optional[np.ndarray] = None,
+    camera_index: int = 0,
+    min_score: Optional[float] = None,
+) -> StateResult:
+    """Decide which of a region's state templates the live crop shows.
+
+    State templates live in templates/states/<Name>/<label>.png (saved by
+    calibrate.save_state_from_frame). They are kept as one contiguous (K, N)
+    array of zero-mean, unit-norm rows, so a single matrix-vector product
+    yields the NCC score of every state. Returns the winning label (None if
+    its score is below min_score), its score and its margin over the
+    runner-up.
+    """
+    cfg = _load_config()
+    name_key = _normalize_name(name)
+    x, y, w, h = _get_region_coords(cfg, name_key)
+    labels, stack = _state_stack(name_key, (w, h))
+
+    if frame is None:
+        frame = _capture_frame(camera_index)
+
+    gray = gray_crop(frame, (x, y, w, h), cfg)
+    if gray.shape != (h, w):
+        gray = cv.resize(gray, (w, h), interpolation=cv.INTER_AREA)
+    vec = _normalized_rows(gray.reshape(1, -1).astype(np.float32))[0]
+    scores = stack @ vec
+    order = np.argsort(scores)[::-1]
+    best = float(scores[order[0]])
+    runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+    label = labels[order[0]]
+    if min_score is not None and best < min_score:
+        label = None
+    journal.log("state", name=name_key, label=label, score=round(best, 4))
+    return StateResult(label, best, best - runner_up,
+                       {l: float(v) for l, v in zip(labels, scores)})
+
+
+# ---------------------------------------------------------------------------
+# Warm-up
+# ---------------------------------------------------------------------------
+
+def warmup(frame: Optional[np.ndarray] = None, ocr: bool = True) -> Dict[str, Optional[float]]:
+    """Pay one-off costs up front instead of on the first check()/get_text().
+
+    Loads template pyramids, state stacks, glyph sets and OCR pipelines for
+    every configured region, runs each region's matcher once on `frame` (if
+    given) and primes tesseract with a tiny image. Returns the seconds spent
+    per step; "ocr" is None when pytesseract is not available.
+    """
+    timings: Dict[str, Optional[float]] = {}
+    t = time.perf_counter()
+    cfg = _load_config()
+    for name_key, rect in cfg.get("REGIONS", {}).items():
+        x, y, w, h = map(int, rect)
+        try:
+            _template_pyramid(name_key, (w, h), MAX_PYRAMID_LEVELS)
+        except (FileNotFoundError, RuntimeError):
+            pass
+        try:
+            _state_stack(name_key, (w, h))
+        except (FileNotFoundError, RuntimeError):
+            pass
+        _load_glyphs(name_key)
+        _ocr_pipeline(name_key, _region_options(cfg, name_key).get("ocr"))
+    timings["templates"] = time.perf_counter() - t
+
+    if frame is not None:
+        t = time.perf_counter()
+        for name_key in cfg.get("REGIONS", {}):
+            # not match(): warm-up scores must not end up in the score
+            # history, the last-hit memory or the journal
+            try:
+                _score_once(frame, cfg, name_key, _analysis_level(cfg, name_key))
+            except (FileNotFoundError, RuntimeError):
+                pass
+        timings["match"] = time.perf_counter() - t
+
+    if ocr:
+        t = time.perf_counter()
         try:
-            tmpl = cv.resize(template, (iw, ih), interpolation=cv.INTER_AREA)
+            import pytesseract
+            from PIL import Image
+            pytesseract.image_to_string(Image.new("L", (64, 32), 255))
+            timings["ocr"] = time.perf_counter() - t
         except Exception:
-            tmpl = template
+            timings["ocr"] = None
+    return timings
 
-    # convert to gray for template matching
-    g_img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
-    g_tmpl = cv.cvtColor(tmpl, cv.COLOR_BGR2GRAY)
 
-    # perform normalized cross-correlation
-    res = cv.matchTemplate(g_img, g_tmpl, cv.TM_CCOEFF_NORMED)
-    min_val, max_val, min_loc, max_loc = cv.minMaxLoc(res)
-    return float(max_val) >= float(threshold)
+# ---------------------------------------------------------------------------
+# Multi-region executor
+# ---------------------------------------------------------------------------
+
+# per-worker state: attached crop arenas
+_worker_arenas: "OrderedDict[str, object]" = OrderedDict()
+
+
+def _worker_init() -> None:
+    # pay the imports once per worker instead of on the first job
+    try:
+        import pytesseract  # noqa: F401
+        from PIL import Image  # noqa: F401
+    except Exception:
+        pass
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _worker_crop(arena: str, offset: int, shape: Tuple[int, ...]) -> np.ndarray:
+    shm = _worker_arenas.get(arena)
+    if shm is None:
+        shm = framebus.attach_shm(arena)
+        _worker_arenas[arena] = shm
+        while len(_worker_arenas) > 4:
+            _, old = _worker_arenas.popitem(last=False)
+            old.close()  # type: ignore[attr-defined]
+    else:
+        _worker_arenas.move_to_end(arena)
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)  # type: ignore[attr-defined]
+
+
+def _worker_job(kind: str, name_key: str, arena: str, offset: int,
+                shape: Tuple[int, ...], ocr_func=None, ocr_opts=None):
+    img = _worker_crop(arena, offset, shape)
+    if kind == "text":
+        return _ocr_image(img, ocr_func, _ocr_pipeline(name_key, ocr_opts))
+    return _score_region(name_key, img, kind)
+
+
+class RegionExecutor:
+    """Warm process pool that evaluates several regions of one frame in parallel.
+
+    Crops are copied from the frame straight into a shared-memory arena and
+    workers read them in place, so no image data is pickled. Each job has
+    its own deadline (`timeout` per round of `workers` jobs, so jobs queued
+    behind others get their turn); a job that misses it or fails yields None
+    instead of holding up or discarding the others. Failures are logged to
+    the journal as "region_error".
+
+    Typical usage:
+        ex = cam.RegionExecutor()
+        texts = ex.get_texts(["Info_text", "Swipe"], frame=frame)
+        scores = ex.scores(["Home", "Code"], frame=frame)
+        ex.shutdown()
+    """
+
+    def __init__(self, workers: Optional[int] = None, warm: bool = True):
+        import multiprocessing as mp
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=ctx, initializer=_worker_init
+        )
+        self._lock = threading.Lock()
+        self._free: List[shared_memory.SharedMemory] = []
+        if warm:
+            self.warm()
+
+    def warm(self) -> None:
+        """Start all worker processes now rather than on the first batch."""
+        futs = [self._pool.submit(_worker_ping) for _ in range(self.workers)]
+        for f in futs:
+            f.result()
+
+    def _take_arena(self, size: int) -> shared_memory.SharedMemory:
+        with self._lock:
+            for i, shm in enumerate(self._free):
+                if shm.size >= size:
+                    return self._free.pop(i)
+        return shared_memory.SharedMemory(create=True, size=max(size, 1 << 20))
+
+    def _give_arena(self, shm: shared_memory.SharedMemory) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._free.append(shm)
+                return
+        shm.close()
+        shm.unlink()
+
+    def _run(self, kind: str, names: Sequence[str], frame: Optional[np.ndarray],
+             camera_index: int, timeout: float, ocr_func=None) -> Dict[str, object]:
+        cfg = _load_config()
+        if frame is None:
+            frame = _capture_frame(camera_index)
+        keys = [_normalize_name(n) for n in names]
+        # views into the frame; the only copy is the one into the arena
+        crops = [crop(frame, _get_region_coords(cfg, k)) for k in keys]
+        offsets, size = [], 0
+        for c in crops:
+            offsets.append(size)
+            size += (c.nbytes + 63) // 64 * 64
+        arena = self._take_arena(size)
+        for c, off in zip(crops, offsets):
+            np.copyto(np.ndarray(c.shape, dtype=np.uint8, buffer=arena.buf, offset=off), c)
+
+        kinds = [
+            kind if kind == "text"
+            else _region_options(cfg, k).get("matcher", DEFAULT_MATCHER)
+            for k in keys
+        ]
+        futs = [
+            self._pool.submit(_worker_job, kd, k, arena.name, off, c.shape, ocr_func,
+                              _region_options(cfg, k).get("ocr"))
+            for kd, k, c, off in zip(kinds, keys, crops, offsets)
+        ]
+        # the arena goes back to the free list only once every job is done
+        # with it, including jobs that missed their deadline
+        pending = [len(futs)]
+
+        def _done(_f):
+            with self._lock:
+                pending[0] -= 1
+                last = pending[0] == 0
+            if last:
+                self._give_arena(arena)
+
+        for f in futs:
+            f.add_done_callback(_done)
+
+        t0 = time.monotonic()
+        out: Dict[str, object] = {}
+        for i, (k, f) in enumerate(zip(keys, futs)):
+            deadline = t0 + timeout * (i // self.workers + 1)
+            try:
+                out[k] = f.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeout:
+                f.cancel()
+                out[k] = None
+            except Exception as e:
+                journal.log("region_error", name=k, job=kind, error=f"{type(e).__name__}: {e}")
+                out[k] = None
+        return out
+
+    def get_texts(
+        self,
+        names: Sequence[str],
+        frame: Optional[np.ndarray] = None,
+        camera_index: int = 0,
+        timeout: float = 2.0,
+        ocr_func: Optional[Callable[[np.ndarray], str]] = None,
+    ) -> Dict[str, Optional[str]]:
+        """OCR several regions of one frame in parallel.
+
+        Returns name->text, with None for regions that missed the deadline or
+        failed. A custom ocr_func must be picklable (a module-level function).
+        """
+        return self._run("text", names, frame, camera_index, timeout, ocr_func)  # type: ignore[return-value]
+
+    def scores(
+        self,
+        names: Sequence[str],
+        frame: Optional[np.ndarray] = None,
+        camera_index: int = 0,
+        timeout: float = 1.0,
+    ) -> Dict[str, Optional[float]]:
+        """Template-match several regions of one frame in parallel (None where a job failed)."""
+        return self._run("score", names, frame, camera_index, timeout)  # type: ignore[return-value]
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            free, self._free = self._free, []
+        for shm in free:
+            shm.close()
+            shm.unlink()
 
 
-__all__ = ["get_text", "check", "crop"]
+__all__ = [
+    "get_text", "check", "match", "MatchResult", "crop", "frame_gray", "gray_crop", "RegionExecutor",
+    "analysis_scale", "scale_scores", "ANALYSIS_SCALES",
+    "MATCHERS", "register_matcher", "OcrPipeline", "recognize",
+    "classify", "StateResult", "warmup",
+    "ScoreHistory", "score_history", "confirm", "tune_threshold", "TuneResult",
+]
@@ -0,0 +1,180 @@
+"""Background drift compensation for Pi-Droid regions.
+
+When the phone or the camera mount moves a little, every calibrated region in
+`config.json` is off by the same small transform. `DriftTracker` runs at a low
+rate in a background thread: it matches ORB (or AKAZE) keypoints of the live
+frame against the reference frame saved at calibration time
+(templates/reference.png), estimates a homography, and when the regions have
+moved by more than `threshold` pixels it publishes corrected coordinates to
+`drift.json`.
+
+`cam._get_region_coords` picks those up (atomically, via rename) in every
+process, so per-frame checks stay as cheap as before and only the occasional
+re-estimation pays for feature detection. Overrides are tied to the config
+CALIBRATION (bumped whenever reference.png is captured anew) they were
+computed for and are ignored after a recalibration; option changes and
+re-saves of single regions keep them. drift.json also carries the homography
+`H`, which calibrate.py uses to map regions drawn on a drifted frame back to
+reference coordinates.
+
+Typical usage:
+    import drift
+    tracker = drift.DriftTracker(camera.get_frame)
+    tracker.start()
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+import calibrate
+import cam
+
+REFERENCE_PATH = calibrate.REFERENCE_PATH
+DRIFT_PATH = cam.DRIFT_PATH
+# features are detected on a downscaled frame; coordinates are scaled back
+FEATURE_SCALE = 0.5
+MIN_INLIERS = 15
+RATIO_TEST = 0.75
+
+
+def _detector(kind: str):
+    if kind == "akaze":
+        return cv.AKAZE_create()
+    return cv.ORB_create(nfeatures=1000)
+
+
+def _features(detector, frame: np.ndarray):
+    gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    if FEATURE_SCALE != 1.0:
+        gray = cv.resize(gray, None, fx=FEATURE_SCALE, fy=FEATURE_SCALE, interpolation=cv.INTER_AREA)
+    return detector.detectAndCompute(gray, None)
+
+
+def transform_regions(regions: Dict[str, List[int]], H: np.ndarray) -> Dict[str, List[int]]:
+    """Move each [x,y,w,h] so its center follows the homography H; sizes are kept."""
+    out = {}
+    for name, (x, y, w, h) in regions.items():
+        c = np.array([[[x + w / 2.0, y + h / 2.0]]], np.float32)
+        cx, cy = cv.perspectiveTransform(c, H)[0, 0]
+        out[name] = [int(round(cx - w / 2.0)), int(round(cy - h / 2.0)), int(w), int(h)]
+    return out
+
+
+def _max_shift(a: Dict[str, List[int]], b: Dict[str, List[int]]) -> float:
+    return max((max(abs(a[k][0] - b[k][0]), abs(a[k][1] - b[k][1])) for k in a), default=0.0)
+
+
+def publish(regions: Optional[Dict[str, List[int]]], calibration: int, info: Optional[dict] = None) -> None:
+    """Atomically write drift.json; regions=None clears the overrides."""
+    doc = {"calibration": int(calibration), "regions": regions or {}, "time": time.time()}
+    if info:
+        doc.update(info)
+    calibrate._atomic_write(DRIFT_PATH, json.dumps(doc, indent=2).encode("utf-8"))
+
+
+class DriftTracker:
+    """Low-rate background estimator of region drift.
+
+    frame_source: callable returning the latest BGR frame (or None)
+    interval: seconds between estimates
+    threshold: region shift in pixels before corrected coordinates are published
+    """
+
+    def __init__(self, frame_source: Callable[[], Optional[np.ndarray]],
+                 interval: float = 5.0, threshold: float = 2.0, detector: str = "orb"):
+        self.frame_source = frame_source
+        self.interval = float(interval)
+        self.threshold = float(threshold)
+        self._detector = _detector(detector)
+        self._matcher = cv.BFMatcher(cv.NORM_HAMMING)
+        self._ref = None  # (config CALIBRATION, keypoints, descriptors)
+        self._published: Optional[Dict[str, List[int]]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.status = {"state": "idle", "shift": 0.0, "inliers": 0, "last_run": None}
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                self.status["state"] = f"error: {e}"
+
+    def _reference(self):
+        snap = calibrate.regions_snapshot()
+        if self._ref is not None and self._ref[0] == snap.calibration:
+            return self._ref
+        ref = cv.imread(REFERENCE_PATH, cv.IMREAD_COLOR)
+        if ref is None:
+            self._ref = None
+            return None
+        kps, desc = _features(self._detector, ref)
+        self._ref = (snap.calibration, kps, desc)
+        self._published = None
+        return self._ref
+
+    def estimate(self, frame: np.ndarray) -> Tuple[Optional[np.ndarray], int]:
+        """Homography from reference to live frame (full-res coords) and inlier count."""
+        ref = self._reference()
+        if ref is None or ref[2] is None:
+            return None, 0
+        kps, desc = _features(self._detector, frame)
+        if desc is None or len(kps) < MIN_INLIERS:
+            return None, 0
+        pairs = self._matcher.knnMatch(ref[2], desc, k=2)
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < RATIO_TEST * p[1].distance]
+        if len(good) < MIN_INLIERS:
+            return None, len(good)
+        src = np.float32([ref[1][m.queryIdx].pt for m in good]) / FEATURE_SCALE
+        dst = np.float32([kps[m.trainIdx].pt for m in good]) / FEATURE_SCALE
+        H, mask = cv.findHomography(src, dst, cv.RANSAC, 3.0)
+        inliers = int(mask.sum()) if mask is not None else 0
+        if H is None or inliers < MIN_INLIERS:
+            return None, inliers
+        return H, inliers
+
+    def step(self) -> Optional[Dict[str, List[int]]]:
+        """Run one estimate; returns the published regions if they changed."""
+        frame = self.frame_source()
+        if frame is None:
+            return None
+        H, inliers = self.estimate(frame)
+        self.status.update(inliers=inliers, last_run=time.time())
+        if H is None:
+            self.status["state"] = "no reference" if self._ref is None else "no fit"
+            return None
+        # regions re-saved since the reference was taken move along too
+        calibration, regions = self._ref[0], calibrate.regions_snapshot().regions
+        moved = transform_regions(regions, H)
+        shift = _max_shift(regions, moved)
+        self.status.update(state="ok", shift=float(shift))
+        target = moved if shift > self.threshold else None
+        current = self._published
+        if target is None and current is None:
+            return None
+        if (target is not None and current is not None and target.keys() == current.keys()
+                and _max_shift(target, current) < 1):
+            return None
+        info = {"shift": float(shift), "inliers": inliers}
+        if target is not None:
+            info["H"] = H.tolist()
+        publish(target, calibration, info)
+        self._published = target
+        return target
+
+
+__all__ = ["DriftTracker", "transform_regions", "publish", "REFERENCE_PATH", "DRIFT_PATH"]
@@ -0,0 +1,235 @@
+"""Shared-memory frame bus used by Pi-Droid.
+
+The camera reader in `Server.py` publishes every frame into a ring of
+fixed-size slots in a `multiprocessing.shared_memory` block. Other processes
+(analysis workers, automation scripts, recorders) attach by name and read
+frames without copying and without going through the GIL of the server.
+
+Each slot is guarded by a seqlock-style version counter: the writer makes the
+version odd while it copies a frame in and even again when done. Readers take
+the version before and after using a slot; if it changed (or was odd), the
+frame was torn and the read is retried.
+
+Typical usage (reader side):
+    import framebus
+    bus = framebus.FrameBus.attach()
+    frame, ts, seq = bus.read_latest()
+    bus.close()
+
+Timestamps are time.monotonic() values, which on Linux share one clock across
+processes.
+
+Readers also stamp the header's `demand` field whenever they read, so the
+writer can tell that another process is consuming frames (see
+`FrameBus.last_demand`) and keep capturing at full rate.
+"""
+
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+import threading
+import time
+import numpy as np
+
+FRAMEBUS_NAME = "pidroid_frames"
+DEFAULT_SLOTS = 4
+
+_MAGIC = 0x50494446  # "PIDF"
+_HEADER_SIZE = 64
+_SLOT_HEADER_SIZE = 32
+_ALIGN = 64
+
+_attach_lock = threading.Lock()
+
+# global header: magic, nslots, height, width, channels, (pad), latest seq,
+# monotonic time of the last read by any reader
+_HDR_DTYPE = np.dtype([
+    ("magic", "<u4"), ("nslots", "<u4"), ("height", "<u4"), ("width", "<u4"),
+    ("channels", "<u4"), ("_pad", "<u4"), ("latest", "<u8"), ("demand", "<f8"),
+])
+_SLOT_DTYPE = np.dtype([("version", "<u8"), ("seq", "<u8"), ("ts", "<f8"), ("_pad", "<u8")])
+
+
+class SlotView(NamedTuple):
+    """Zero-copy view on one slot; call FrameBus.still_valid(view) after use."""
+    frame: np.ndarray
+    ts: float
+    seq: int
+    slot: int
+    version: int
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def attach_shm(name: str) -> shared_memory.SharedMemory:
+    # Readers must not unlink the block when they exit. Before 3.13 every
+    # attach registers the name with the resource tracker (which unlinks it
+    # at exit), and unregistering afterwards would also drop the owner's
+    # registration when the tracker is shared, so skip registration instead.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None  # type: ignore[assignment]
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register  # type: ignore[assignment]
+
+
+class FrameBus:
+    """Ring of frame slots in shared memory (single writer, many readers)."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        self._hdr = np.ndarray((1,), dtype=_HDR_DTYPE, buffer=buf, offset=0)
+        if int(self._hdr["magic"][0]) != _MAGIC:
+            raise RuntimeError(f"Shared memory '{shm.name}' is not a frame bus")
+        n = int(self._hdr["nslots"][0])
+        h, w, c = (int(self._hdr[k][0]) for k in ("height", "width", "channels"))
+        self.nslots = n
+        self.shape = (h, w, c) if c > 1 else (h, w)
+        self._slots = np.ndarray((n,), dtype=_SLOT_DTYPE, buffer=buf, offset=_HEADER_SIZE)
+        data_off = _align(_HEADER_SIZE + n * _SLOT_HEADER_SIZE)
+        self.slot_bytes = _align(h * w * c)
+        self._frames = [
+            np.ndarray(self.shape, dtype=np.uint8, buffer=buf, offset=data_off + i * self.slot_bytes)
+            for i in range(n)
+        ]
+
+    # -- construction ---------------------------------------------------
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], nslots: int = DEFAULT_SLOTS,
+               name: str = FRAMEBUS_NAME) -> "FrameBus":
+        """Create (or replace) a bus for frames of the given uint8 shape."""
+        h, w = int(shape[0]), int(shape[1])
+        c = int(shape[2]) if len(shape) > 2 else 1
+        size = _align(_HEADER_SIZE + nslots * _SLOT_HEADER_SIZE) + nslots * _align(h * w * c)
+        try:
+            stale = attach_shm(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        hdr = np.ndarray((1,), dtype=_HDR_DTYPE, buffer=shm.buf, offset=0)
+        hdr[0] = (_MAGIC, nslots, h, w, c, 0, 0, 0.0)
+        slots = np.ndarray((nslots,), dtype=_SLOT_DTYPE, buffer=shm.buf, offset=_HEADER_SIZE)
+        slots[:] = 0
+        del hdr, slots
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str = FRAMEBUS_NAME) -> "FrameBus":
+        """Attach to an existing bus. Raises FileNotFoundError if none is published."""
+        return cls(attach_shm(name), owner=False)
+
+    def close(self) -> None:
+        """Drop all views and detach; the owner also unlinks the block."""
+        self._hdr = self._slots = None  # type: ignore[assignment]
+        self._frames = []
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # -- writer ---------------------------------------------------------
+
+    def publish(self, frame: np.ndarray, ts: Optional[float] = None) -> int:
+        """Copy frame into the next slot and return its sequence number."""
+        if frame.shape != self.shape:
+            raise ValueError(f"frame shape {frame.shape} does not match bus shape {self.shape}")
+        seq = int(self._hdr["latest"][0]) + 1
+        i = seq % self.nslots
+        slot = self._slots[i:i + 1]
+        slot["version"] += 1  # odd: write in progress
+        np.copyto(self._frames[i], frame)
+        slot["seq"] = seq
+        slot["ts"] = time.monotonic() if ts is None else ts
+        slot["version"] += 1  # even: stable
+        self._hdr["latest"] = seq
+        return seq
+
+    # -- readers --------------------------------------------------------
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self._hdr["latest"][0])
+
+    def last_demand(self) -> float:
+        """Monotonic time of the most recent read by any reader (0.0 if none)."""
+        return float(self._hdr["demand"][0])
+
+    def _stamp_demand(self) -> None:
+        self._hdr["demand"] = time.monotonic()
+
+    def view(self, seq: Optional[int] = None) -> Optional[SlotView]:
+        """Return a zero-copy view of frame `seq` (default: latest).
+
+        Returns None if nothing was published yet or the frame has already
+        been overwritten. The view stays valid until the writer wraps around
+        the ring; check with still_valid() once done with it.
+        """
+        for _ in range(8):
+            s = self.latest_seq if seq is None else seq
+            if s == 0:
+                return None
+            i = s % self.nslots
+            v = int(self._slots["version"][i])
+            if v & 1:
+                time.sleep(0)
+                continue
+            if int(self._slots["seq"][i]) != s:
+                if seq is not None:
+                    return None
+                continue
+            ts = float(self._slots["ts"][i])
+            return SlotView(self._frames[i], ts, s, i, v)
+        return None
+
+    def still_valid(self, view: SlotView) -> bool:
+        """True if the slot behind `view` has not been rewritten since."""
+        return int(self._slots["version"][view.slot]) == view.version
+
+    def read_latest(self) -> Tuple[Optional[np.ndarray], float, int]:
+        """Return a consistent copy of the newest frame as (frame, ts, seq)."""
+        self._stamp_demand()
+        for _ in range(8):
+            v = self.view()
+            if v is None:
+                return None, 0.0, 0
+            out = v.frame.copy()
+            if self.still_valid(v):
+                return out, v.ts, v.seq
+        return None, 0.0, 0
+
+    def next_frame_after(self, t: float, timeout: float = 2.0,
+                         poll: float = 0.002) -> Tuple[Optional[np.ndarray], float]:
+        """Poll until a frame exposed after monotonic time `t` is published.
+
+        Returns (frame copy, ts) or (None, 0.0) on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        last = -1
+        while time.monotonic() < deadline:
+            self._stamp_demand()
+            s = self.latest_seq
+            if s != last:
+                last = s
+                frame, ts, _ = self.read_latest()
+                if frame is not None and ts > t:
+                    return frame, ts
+            time.sleep(poll)
+        return None, 0.0
+
+
+__all__ = ["FrameBus", "SlotView", "attach_shm", "FRAMEBUS_NAME", "DEFAULT_SLOTS"]
@@ -16,9 +16,12 @@ callers can handle them. A minimal CLI is provided for convenience.
 """
 
 from pathlib import Path
+import os
 import time
 from typing import Iterable
 
+import journal
+
 # HID keycodes (usage IDs) für Zahlen über das Hauptlayout (nicht Numpad)
 NUM_KEYCODES = {
     '1': 0x1E, '2': 0x1F, '3': 0x20, '4': 0x21, '5': 0x22,
@@ -35,6 +38,8 @@ VOLUME_UP_USAGE = 0xE9
 VOLUME_DOWN_USAGE = 0xEA
 # Power key usage - this can vary; adjust if your gadget expects a different code.
 POWER_USAGE = 0x30
+# consumer control function created by setup_hid_gadget.sh
+CONSUMER_DEVICE = Path("/dev/hidg1")
 
 
 class HIDTyper:
@@ -73,6 +78,7 @@ class HIDTyper:
         if not s.isdigit():
             raise ValueError("Only digits (0-9) are allowed in the input string")
 
+        journal.log("hid", name="keyboard", device=str(self.device), text=s, enter=press_enter)
         # open as binary write, unbuffered
         with open(str(self.device), "wb+", buffering=0) as fd:
             for ch in s:
@@ -89,51 +95,83 @@ def type_numbers_on_device(device: Path, numbers: str, delay: float = 0.03) -> N
     typer.type_numbers(numbers, delay=delay)
 
 
-def _send_raw_report(device: Path, data: bytes) -> None:
+def _send_raw_report(device: Path, data: bytes, hold: float = 0.02) -> None:
     """Send raw bytes to the HID device (no interpretation).
 
     Useful for consumer control reports which often have different report
     lengths than the keyboard (e.g. 2 bytes). This function will write the
-    bytes and then write a release (zeros) if the length is >0.
+    bytes, keep them pressed for `hold` seconds and then write a release
+    (zeros) if the length is >0.
     """
     dev = Path(device)
     if not dev.exists():
         raise FileNotFoundError(f"{dev} not found. Gadget not set up or not bound?")
+    journal.log("hid", name="raw", device=str(dev), report=data.hex())
     with open(str(dev), "wb+", buffering=0) as fd:
         fd.write(data)
         fd.flush()
-        time.sleep(0.02)
+        time.sleep(hold)
         # release (send zeros of same length)
         fd.write(b"\x00" * len(data))
         fd.flush()
         time.sleep(0.02)
 
 
-def send_consumer_usage(device: Path, usage: int) -> None:
+def consumer_report(usage: int) -> bytes:
+    """Pack a Consumer Page usage ID into the 2-byte report (low byte first)."""
+    if usage < 0 or usage > 0xFFFF:
+        raise ValueError("usage must be a 0..0xFFFF integer")
+    return bytes([usage & 0xFF, (usage >> 8) & 0xFF])
+
+
+def send_consumer_usage(device: Path, usage: int, hold: float = 0.02) -> None:
     """Send a Consumer Page usage ID to the given device.
 
     By convention many setups expose a consumer control HID at /dev/hidg1 which
     accepts a 2-byte report containing the usage ID (low byte first). This
     helper packs the usage into 2 bytes and sends it as a press+release.
     """
-    if usage < 0 or usage > 0xFFFF:
-        raise ValueError("usage must be a 0..0xFFFF integer")
-    lo = usage & 0xFF
-    hi = (usage >> 8) & 0xFF
-    _send_raw_report(device, bytes([lo, hi]))
+    _send_raw_report(device, consumer_report(usage), hold)
 
 
-def send_volume_up(device: Path = Path("/dev/hidg1")) -> None:
+def open_nonblocking(device: Path) -> int:
+    """Open a gadget device for write_report(); raises FileNotFoundError if missing."""
+    dev = Path(device)
+    if not dev.exists():
+        raise FileNotFoundError(f"{dev} not found. Gadget not set up or not bound?")
+    return os.open(str(dev), os.O_WRONLY | os.O_NONBLOCK)
+
+
+def write_report(fd: int, data: bytes, timeout: float = 0.5) -> None:
+    """Write one report to a non-blocking gadget fd.
+
+    The gadget accepts a new report only after the host fetched the previous
+    one (once per polling interval). Retries until then and raises
+    TimeoutError when the host does not poll within `timeout`, e.g. because
+    the USB path is switched away or the host is asleep.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.write(fd, data)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError("HID host did not fetch the report in time")
+            time.sleep(0.001)
+
+
+def send_volume_up(device: Path = CONSUMER_DEVICE) -> None:
     """Send a Volume Up consumer control event to the device."""
     send_consumer_usage(device, VOLUME_UP_USAGE)
 
 
-def send_volume_down(device: Path = Path("/dev/hidg1")) -> None:
+def send_volume_down(device: Path = CONSUMER_DEVICE) -> None:
     """Send a Volume Down consumer control event to the device."""
     send_consumer_usage(device, VOLUME_DOWN_USAGE)
 
 
-def send_power(device: Path = Path("/dev/hidg1")) -> None:
+def send_power(device: Path = CONSUMER_DEVICE) -> None:
     """Send a Power button event. Usage ID may vary by platform/gadget.
 
     If this doesn't perform the expected action, check your HID report
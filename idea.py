@@ -1,4 +1,5 @@
 import cam 
+import actuate
 import relais as rpi
 
 
@@ -6,18 +7,20 @@ wrong_code = "Falscher Code. Bitte erneut versuchen."
 swipe_text = "Zum Entsperren wischen"
 
 def clear_cache():
+    # buttons go through HID when the gadget is reachable, else via servo
     # Trigger Reboot
-    rpi.DOWN(seconds=5)
-    rpi.PWR(seconds=5)
+    actuate.DOWN(seconds=5)
+    actuate.PWR(seconds=5)
     rpi.switch_usb(mode="usb")  # switch to USB mode for recovery
-    rpi.UP(seconds=5)
-    rpi.PWR(seconds=5)
+    actuate.UP(seconds=5)
+    actuate.PWR(seconds=5)
     for i in range(5):
-        rpi.DOWN()
-    rpi.PWR()
-    rpi.DOWN()
-    rpi.PWR()
+        actuate.DOWN()
+    actuate.PWR()
+    actuate.DOWN()
+    actuate.PWR()
     rpi.switch_usb(mode="otg")  # switch back to OTG mode
+    actuate.wait()
     rpi.cleanup()
 
 def get_timeout():
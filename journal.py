@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+journal.py
+
+Append-only run journal for Pi-Droid with an asynchronous writer.
+
+Events are small dicts written as one JSON line each, stamped with
+time.monotonic() (`t`). The hot path only builds the
+dict and puts it on a bounded queue; a background thread serializes, writes
+and rotates. When the queue is full events are dropped and counted instead
+of blocking the caller.
+
+Recorded by the modules themselves once a journal is open:
+  - region evaluations with scores (cam.match), OCR text (cam.get_text)
+  - HID reports (hid_input), servo presses (relais), button presses with
+    backend and latency (actuate)
+  - API calls (Server.py)
+
+`snapshot(frame, ...)` stores a downscaled JPEG of a frame next to the
+journal (resized and encoded on the writer thread) and logs an event that
+references it. The snapshot directory is size-capped; the oldest files are
+deleted first.
+
+Usage:
+    import journal
+    journal.open_journal("journal")          # once, at startup
+    journal.log("note", text="retrying")     # anywhere; no-op if not open
+
+Reader (post-mortem timelines):
+    python journal.py journal --kind region --name Home
+    python journal.py journal --since 120 --until 180 --json
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2 as cv
+
+JOURNAL_FILE = "run.jsonl"
+SNAPSHOT_DIR = "frames"
+MAX_JOURNAL_BYTES = 16 * 2**20      # rotate run.jsonl -> run.jsonl.1 beyond this
+MAX_SNAPSHOT_BYTES = 64 * 2**20     # total size of the snapshot directory
+SNAPSHOT_SCALE = 0.25
+QUEUE_SIZE = 10000
+
+
+class Journal:
+    """Bounded queue plus writer thread appending JSON lines to `directory`."""
+
+    def __init__(self, directory: str, max_bytes: int = MAX_JOURNAL_BYTES,
+                 max_snapshot_bytes: int = MAX_SNAPSHOT_BYTES, snapshot_scale: float = SNAPSHOT_SCALE):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_dir = os.path.join(directory, SNAPSHOT_DIR)
+        self.max_bytes = max_bytes
+        self.max_snapshot_bytes = max_snapshot_bytes
+        self.snapshot_scale = snapshot_scale
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(QUEUE_SIZE)
+        self._snap_seq = 0
+        self._snap_lock = threading.Lock()
+        self._snapshots = self._scan_snapshots()
+        self.dropped = 0
+        self.written = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+        # wall clock reference so the reader can show absolute times
+        self.log("session", wall=time.time(), pid=os.getpid())
+
+    # -- hot path ---------------------------------------------------------
+
+    def log(self, kind: str, **fields: Any) -> None:
+        fields["kind"] = kind
+        fields["t"] = time.monotonic()
+        try:
+            self._queue.put_nowait(("event", fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def snapshot(self, frame, kind: str = "snapshot", **fields: Any) -> None:
+        """Queue a downscaled copy of `frame` (not modified afterwards by the caller)."""
+        with self._snap_lock:
+            self._snap_seq += 1
+            name = f"{os.getpid()}_{self._snap_seq:08d}.jpg"
+        fields.update(kind=kind, t=time.monotonic(), frame=f"{SNAPSHOT_DIR}/{name}")
+        try:
+            self._queue.put_nowait(("snapshot", fields, frame, name))
+        except queue.Full:
+            self.dropped += 1
+
+    # -- writer thread ----------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if item[0] == "snapshot":
+                    self._write_snapshot(item[2], item[3])
+                self._file.write(json.dumps(item[1], default=str) + "\n")
+                self.written += 1
+                if self._queue.empty() or self.written % 256 == 0:
+                    self._file.flush()
+                    self._maybe_rotate()
+            except Exception as e:
+                print("journal write failed:", e)
+        self._file.close()
+
+    def _maybe_rotate(self) -> None:
+        if self._file.tell() < self.max_bytes:
+            return
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _scan_snapshots(self) -> List[List]:
+        files = []
+        for f in sorted(os.listdir(self.snapshot_dir)):
+            p = os.path.join(self.snapshot_dir, f)
+            files.append([os.path.getmtime(p), p, os.path.getsize(p)])
+        files.sort()
+        return files
+
+    def _write_snapshot(self, frame, name: str) -> None:
+        s = self.snapshot_scale
+        small = cv.resize(frame, None, fx=s, fy=s, interpolation=cv.INTER_AREA) if s != 1.0 else frame
+        ok, jpeg = cv.imencode(".jpg", small, [cv.IMWRITE_JPEG_QUALITY, 70])
+        if not ok:
+            return
+        path = os.path.join(self.snapshot_dir, name)
+        with open(path, "wb") as f:
+            f.write(jpeg.tobytes())
+        self._snapshots.append([time.time(), path, len(jpeg)])
+        total = sum(e[2] for e in self._snapshots)
+        while total > self.max_snapshot_bytes and len(self._snapshots) > 1:
+            _, old, size = self._snapshots.pop(0)
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+            total -= size
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued events and stop the writer."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+# -- module-level journal used by cam / relais / hid_input / actuate / Server
+
+_journal: Optional[Journal] = None
+
+
+def open_journal(directory: str = "journal", **kwargs: Any) -> Journal:
+    global _journal
+    if _journal is None:
+        _journal = Journal(directory, **kwargs)
+    return _journal
+
+
+def get_journal() -> Optional[Journal]:
+    return _journal
+
+
+def log(kind: str, **fields: Any) -> None:
+    """Record an event in the open journal; does nothing if none is open."""
+    if _journal is not None:
+        _journal.log(kind, **fields)
+
+
+def snapshot(frame, kind: str = "snapshot", **fields: Any) -> None:
+    if _journal is not None and frame is not None:
+        _journal.snapshot(frame, kind, **fields)
+
+
+def close_journal() -> None:
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+
+
+# -- reader ---------------------------------------------------------------
+
+def read_events(directory: str) -> Iterator[Dict[str, Any]]:
+    """Yield events of the rotated and the current journal file in order."""
+    base = os.path.join(directory, JOURNAL_FILE)
+    for path in (base + ".1", base):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+
+
+def timeline(events: Iterator[Dict[str, Any]], kinds: Optional[List[str]] = None,
+             name: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Filter events and add `rel` (seconds since session start) and `wall`.
+
+    since/until are in seconds relative to the start of the session the event
+    belongs to.
+    """
+    start, wall = None, None
+    for ev in events:
+        if ev.get("kind") == "session":
+            start, wall = ev["t"], ev.get("wall")
+        rel = ev["t"] - start if start is not None else ev["t"]
+        if kinds and ev.get("kind") not in kinds:
+            continue
+        if name and ev.get("name") != name:
+            continue
+        if (since is not None and rel < since) or (until is not None and rel > until):
+            continue
+        ev = dict(ev, rel=rel)
+        if wall is not None:
+            ev["wall"] = wall + rel
+        yield ev
+
+
+def format_event(ev: Dict[str, Any]) -> str:
+    skip = ("kind", "t", "rel", "wall")
+    fields = " ".join(f"{k}={v}" for k, v in ev.items() if k not in skip)
+    stamp = time.strftime("%H:%M:%S", time.localtime(ev["wall"])) if "wall" in ev else ""
+    return f"{stamp} {ev['rel']:>10.3f}  {ev['kind']:<10} {fields}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the Pi-Droid run journal as a timeline.")
+    parser.add_argument("directory", nargs="?", default="journal", help="Journal directory")
+    parser.add_argument("--kind", "-k", action="append", help="Only these event kinds (repeatable)")
+    parser.add_argument("--name", "-n", help="Only events for this region / servo / key")
+    parser.add_argument("--since", type=float, help="Seconds after session start")
+    parser.add_argument("--until", type=float, help="Seconds after session start")
+    parser.add_argument("--json", action="store_true", help="Print events as JSON lines")
+    args = parser.parse_args()
+
+    for ev in timeline(read_events(args.directory), args.kind, args.name, args.since, args.until):
+        print(json.dumps(ev) if args.json else format_event(ev))
+
+
+if __name__ == "__main__":
+    main()
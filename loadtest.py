@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+loadtest.py
+
+Drive a running Server.py with simulated browser tabs and report how it holds
+up. Start the server against a replay source so the camera side is
+reproducible, e.g.:
+
+    python Server.py --source recordings/ --fps 30 --no-warmup
+    python loadtest.py --viewers 4 --status-rate 1 --regions-rate 2 \\
+        --save-every 10 --duration 60 --pid $(pgrep -f Server.py)
+
+Simulated load:
+  - N `/video_feed` MJPEG consumers (delivered fps and capture-to-client
+    latency per client, from the X-Capture-Time part header)
+  - `/api/status` and `/api/regions` pollers at the given rates per second
+  - a periodic `/api/calibrate_save` that re-saves the current Home region
+
+Reported: per-client fps and frame latency, request latency percentiles per
+endpoint, and server CPU / RSS sampled from /proc when `--pid` is given (the
+server must run on the same machine for that). Only the standard library is
+used so it can run from any Python.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    v = sorted(values)
+    k = min(len(v) - 1, max(0, int(round(p / 100.0 * (len(v) - 1)))))
+    return v[k]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.viewers: Dict[int, dict] = {}
+
+    def request(self, name: str, dt: Optional[float]) -> None:
+        with self.lock:
+            if dt is None:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            else:
+                self.requests.setdefault(name, []).append(dt)
+
+
+def _conn(base):
+    u = urlsplit(base)
+    return http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+
+
+def _timed(conn, method, path, body=None, headers=None):
+    t0 = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers or {})
+    resp = conn.getresponse()
+    data = resp.read()
+    return resp, data, time.perf_counter() - t0
+
+
+def viewer(base: str, idx: int, stats: Stats, stop: threading.Event) -> None:
+    """Consume /video_feed and record frame count and capture latency."""
+    info = {"frames": 0, "latency": [], "start": time.time(), "end": None, "error": None}
+    stats.viewers[idx] = info
+    try:
+        conn = _conn(base)
+        conn.request("GET", "/video_feed")
+        resp = conn.getresponse()
+        while not stop.is_set():
+            line = resp.fp.readline()
+            if not line:
+                break
+            if not line.startswith(b"--frame"):
+                continue
+            headers = {}
+            while True:
+                h = resp.fp.readline().strip()
+                if not h:
+                    break
+                k, _, v = h.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            n = int(headers.get("content-length", 0))
+            if n <= 0:
+                info["error"] = "server does not send Content-Length"
+                break
+            resp.fp.read(n)
+            now = time.time()
+            info["frames"] += 1
+            if "x-capture-time" in headers:
+                info["latency"].append(now - float(headers["x-capture-time"]))
+        conn.close()
+    except Exception as e:
+        info["error"] = str(e)
+    info["end"] = time.time()
+
+
+def poller(base: str, path: str, rate: float, stats: Stats, stop: threading.Event,
+           use_etag: bool = False) -> None:
+    """GET path `rate` times per second, honouring ETags like the browser pages do."""
+    conn = _conn(base)
+    etag = None
+    interval = 1.0 / rate
+    nxt = time.monotonic()
+    while not stop.is_set():
+        headers = {"If-None-Match": etag} if (use_etag and etag) else {}
+        try:
+            resp, _, dt = _timed(conn, "GET", path, headers=headers)
+            etag = resp.getheader("ETag") or etag
+            stats.request(path, dt)
+        except Exception:
+            stats.request(path, None)
+            conn.close()
+            conn = _conn(base)
+        nxt += interval
+        stop.wait(max(0.0, nxt - time.monotonic()))
+
+
+def saver(base: str, every: float, stats: Stats, stop: threading.Event) -> None:
+    """Re-save the Home region every `every` seconds via /api/calibrate_save."""
+    conn = _conn(base)
+    while not stop.wait(every):
+        try:
+            _, data, _ = _timed(conn, "GET", "/api/regions")
+            regions = json.loads(data).get("regions", {})
+            name = "Home" if "Home" in regions else next(iter(regions), None)
+            if name is None:
+                continue
+            body = json.dumps({"name": name, "rect": regions[name]})
+            _, _, dt = _timed(conn, "POST", "/api/calibrate_save", body=body,
+                              headers={"Content-Type": "application/json"})
+            stats.request("/api/calibrate_save", dt)
+        except Exception:
+            stats.request("/api/calibrate_save", None)
+            conn.close()
+            conn = _conn(base)
+
+
+def _proc_sample(pid: int):
+    """(cpu seconds, rss bytes) of a process from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+def run(args) -> dict:
+    stats = Stats()
+    stop = threading.Event()
+    threads = [threading.Thread(target=viewer, args=(args.url, i, stats, stop), daemon=True)
+               for i in range(args.viewers)]
+    if args.status_rate > 0:
+        threads.append(threading.Thread(target=poller, daemon=True,
+                                        args=(args.url, "/api/status", args.status_rate, stats, stop)))
+    if args.regions_rate > 0:
+        threads.append(threading.Thread(target=poller, daemon=True,
+                                        args=(args.url, "/api/regions", args.regions_rate, stats, stop, True)))
+    if args.save_every > 0:
+        threads.append(threading.Thread(target=saver, daemon=True,
+                                        args=(args.url, args.save_every, stats, stop)))
+
+    proc = []
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    while time.time() - t0 < args.duration:
+        if args.pid:
+            try:
+                proc.append((time.time(),) + _proc_sample(args.pid))
+            except OSError:
+                pass
+        time.sleep(1.0)
+    stop.set()
+    for t in threads:
+        t.join(timeout=2.0)
+
+    report = {"duration": time.time() - t0, "viewers": {}, "requests": {}, "server": None}
+    for i, v in sorted(stats.viewers.items()):
+        span = (v["end"] or time.time()) - v["start"]
+        report["viewers"][i] = {
+            "fps": v["frames"] / span if span > 0 else 0.0,
+            "latency_p50_ms": percentile(v["latency"], 50) * 1000,
+            "latency_p95_ms": percentile(v["latency"], 95) * 1000,
+            "error": v["error"],
+        }
+    for name, vals in sorted(stats.requests.items()):
+        report["requests"][name] = {
+            "count": len(vals), "errors": stats.errors.get(name, 0),
+            "p50_ms": percentile(vals, 50) * 1000, "p95_ms": percentile(vals, 95) * 1000,
+            "p99_ms": percentile(vals, 99) * 1000,
+        }
+    if len(proc) >= 2:
+        (ta, ca, _), (tb, cb, _) = proc[0], proc[-1]
+        report["server"] = {
+            "cpu_percent": 100.0 * (cb - ca) / (tb - ta),
+            "rss_mb_max": max(p[2] for p in proc) / 2**20,
+            "rss_mb_end": proc[-1][2] / 2**20,
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"Duration: {report['duration']:.1f}s")
+    print(f"{'viewer':<8} {'fps':>6} {'lat p50':>9} {'lat p95':>9}")
+    for i, v in report["viewers"].items():
+        print(f"{i:<8} {v['fps']:>6.1f} {v['latency_p50_ms']:>7.1f}ms {v['latency_p95_ms']:>7.1f}ms"
+              + (f"  ({v['error']})" if v["error"] else ""))
+    print(f"{'endpoint':<24} {'count':>6} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, r in report["requests"].items():
+        print(f"{name:<24} {r['count']:>6} {r['errors']:>4} {r['p50_ms']:>7.1f}ms "
+              f"{r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms")
+    if report["server"]:
+        s = report["server"]
+        print(f"Server: CPU {s['cpu_percent']:.0f}%  RSS max {s['rss_mb_max']:.0f} MB "
+              f"(end {s['rss_mb_end']:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running Pi-Droid Server.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Server base URL")
+    parser.add_argument("--viewers", "-n", type=int, default=2, help="Concurrent /video_feed clients")
+    parser.add_argument("--status-rate", type=float, default=1.0, help="/api/status requests per second")
+    parser.add_argument("--regions-rate", type=float, default=2.0, help="/api/regions requests per second")
+    parser.add_argument("--save-every", type=float, default=0.0,
+                        help="Seconds between /api/calibrate_save calls (0 = off)")
+    parser.add_argument("--duration", "-t", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--pid", type=int, default=None, help="Server PID for CPU/RSS sampling")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
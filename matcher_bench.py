@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+matcher_bench.py
+
+Benchmark the region matchers in `cam.MATCHERS` on recorded frames and
+recommend the cheapest one that still separates the two states of a region.
+
+Frames are full camera frames (png/jpg) in two directories: `--positive`
+holds frames where the region shows its calibrated template, `--negative`
+frames where it does not. For every matcher the report lists the median time
+per call, the lowest positive and the highest negative score, and the margin
+between them. A matcher "separates" the states when that margin is positive;
+the recommendation requires at least `--min-margin` and uses the midpoint
+as threshold.
+
+Without recordings, `--synth N` renders N positive and N negative frames
+with `synth.py` instead (distortions via --noise, --blur, --moire, ...).
+
+`--scales` also reports the separation of the region's matcher at every
+analysis scale (native, 1/2, 1/4, 1/8 resolution). With `--apply` these
+scores are stored in config.json, and cam.match runs the region at the
+coarsest scale up to its REGION_OPTIONS "analysis_scale" that still
+separates the states.
+
+Example:
+    python matcher_bench.py --region Home --positive rec/home_on --negative rec/home_off
+    python matcher_bench.py --region Home --synth 50 --noise 6 --moire 8
+    python matcher_bench.py --region Home --positive ... --negative ... --apply
+    python matcher_bench.py --region Home --synth 50 --scales
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import cv2 as cv
+import numpy as np
+
+import cam
+import synth
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class MatcherReport(NamedTuple):
+    matcher: str
+    median_us: float
+    min_positive: float
+    max_negative: float
+
+    @property
+    def margin(self) -> float:
+        return self.min_positive - self.max_negative
+
+    @property
+    def separates(self) -> bool:
+        return self.margin > 0
+
+    @property
+    def threshold(self) -> float:
+        return (self.min_positive + self.max_negative) / 2.0
+
+
+def load_frames(directory: Path) -> List[np.ndarray]:
+    frames = []
+    for p in sorted(Path(directory).iterdir()):
+        if p.suffix.lower() in IMAGE_SUFFIXES:
+            img = cv.imread(str(p), cv.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+    if not frames:
+        raise FileNotFoundError(f"No frames found in {directory}")
+    return frames
+
+
+def benchmark(region: str, positives: List[np.ndarray], negatives: List[np.ndarray],
+              matchers: Optional[List[str]] = None, repeat: int = 5) -> List[MatcherReport]:
+    """Score every frame with every matcher; returns one report per matcher."""
+    cfg = cam._load_config()
+    name_key = cam._normalize_name(region)
+    rect = cam._get_region_coords(cfg, name_key)
+    pos = [cam.crop(f, rect) for f in positives]
+    neg = [cam.crop(f, rect) for f in negatives]
+
+    reports = []
+    for m in matchers or list(cam.MATCHERS):
+        # first call prepares and caches the template reference
+        cam._score_region(name_key, pos[0], m)
+        times = []
+        for _ in range(repeat):
+            for img in pos + neg:
+                t0 = time.perf_counter()
+                cam._score_region(name_key, img, m)
+                times.append(time.perf_counter() - t0)
+        ps = [cam._score_region(name_key, img, m) for img in pos]
+        ns = [cam._score_region(name_key, img, m) for img in neg]
+        reports.append(MatcherReport(m, float(np.median(times)) * 1e6, min(ps), max(ns)))
+    return reports
+
+
+def recommend(reports: List[MatcherReport], min_margin: float = 0.05) -> Optional[MatcherReport]:
+    """Cheapest matcher whose scores separate the two states by min_margin, if any."""
+    good = [r for r in reports if r.margin >= min_margin]
+    return min(good, key=lambda r: r.median_us) if good else None
+
+
+def print_report(region: str, reports: List[MatcherReport], min_margin: float = 0.05) -> None:
+    print(f"Region: {region}")
+    print(f"{'matcher':<10} {'median us':>10} {'min pos':>8} {'max neg':>8} {'margin':>8}  separates")
+    for r in sorted(reports, key=lambda r: r.median_us):
+        print(f"{r.matcher:<10} {r.median_us:>10.1f} {r.min_positive:>8.3f} "
+              f"{r.max_negative:>8.3f} {r.margin:>8.3f}  {'yes' if r.separates else 'no'}")
+    best = recommend(reports, min_margin)
+    if best is None:
+        print(f"No matcher separates the recorded states by at least {min_margin}.")
+    else:
+        print(f"Recommended: {best.matcher} (threshold {best.threshold:.3f})")
+
+
+def print_scales(region: str, scores: dict, min_margin: float = cam.MIN_SCALE_SEPARATION) -> None:
+    matcher = cam._region_options(cam._load_config(), cam._normalize_name(region)).get(
+        "matcher", cam.DEFAULT_MATCHER)
+    print(f"Analysis scales ({matcher}):")
+    print(f"{'scale':<10} {'min pos':>8} {'max neg':>8} {'margin':>8}  separates")
+    for key, (pos, neg) in scores.items():
+        print(f"{key:<10} {pos:>8.3f} {neg:>8.3f} {pos - neg:>8.3f}  "
+              f"{'yes' if pos - neg >= min_margin else 'no'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark region matchers on recorded frames.")
+    parser.add_argument("--region", "-r", required=True, help="Region name, e.g. Home")
+    parser.add_argument("--positive", "-p", help="Directory of frames showing the template state")
+    parser.add_argument("--negative", "-n", help="Directory of frames showing any other state")
+    parser.add_argument("--synth", type=int, default=0,
+                        help="Render this many synthetic positives and negatives instead")
+    parser.add_argument("--matcher", "-m", action="append", help="Only benchmark these matchers")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions per frame")
+    parser.add_argument("--min-margin", type=float, default=0.05,
+                        help="Required gap between positive and negative scores")
+    parser.add_argument("--scales", action="store_true",
+                        help="Also report the separation at every analysis scale")
+    parser.add_argument("--apply", action="store_true",
+                        help="Write the recommended matcher and threshold (and with --scales "
+                             "the per-scale scores) to config.json")
+    synth.add_variation_args(parser)
+    args = parser.parse_args()
+
+    if args.synth > 0:
+        positives, negatives = synth.frames_for_region(
+            args.region, args.synth, synth.variation_from_args(args), args.seed)
+    elif args.positive and args.negative:
+        positives, negatives = load_frames(Path(args.positive)), load_frames(Path(args.negative))
+    else:
+        parser.error("either --positive and --negative or --synth is required")
+
+    reports = benchmark(args.region, positives, negatives, args.matcher, args.repeat)
+    print_report(args.region, reports, args.min_margin)
+
+    best = recommend(reports, args.min_margin)
+    if args.apply and best is not None:
+        import calibrate
+        calibrate.set_region_options(cam._normalize_name(args.region),
+                                     matcher=best.matcher, threshold=round(best.threshold, 4))
+
+    if args.scales:
+        # measured after --apply so the scores belong to the matcher in use
+        if args.apply:
+            import calibrate
+            scores = calibrate.record_scale_scores(cam._normalize_name(args.region),
+                                                   positives, negatives)
+        else:
+            scores = cam.scale_scores(args.region, positives, negatives)
+        print_scales(args.region, scores)
+
+
+if __name__ == "__main__":
+    main()
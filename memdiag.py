@@ -0,0 +1,181 @@
+"""Memory diagnostics and buffer pools for the long-running server.
+
+`Server.py` runs for days on a Pi with 512MB-1GB of RAM, so the capture and
+streaming paths reuse preallocated buffers instead of allocating per frame:
+
+  - `BufferPool` hands out equally shaped arrays from a free list and counts
+    how many were ever allocated, so a leak or a churning path shows up as a
+    growing `allocated` count instead of as slow RSS creep.
+  - `track(kind, array)` registers arrays handed out to callers (frame
+    copies, JPEG buffers) in a weak set, so the number and size of the ones
+    still alive can be reported without keeping them alive.
+
+The tracemalloc helpers take snapshots and diff each against the previous
+one, reporting the top allocation sites. Tracing costs CPU and memory itself,
+so it is off until `start_tracing()` is called (e.g. via /api/diag/memory).
+"""
+
+from typing import Dict, List, Optional, Tuple
+import threading
+import tracemalloc
+import weakref
+
+import numpy as np
+
+# -- buffer pools -------------------------------------------------------
+
+_pools: "weakref.WeakValueDictionary[str, BufferPool]" = weakref.WeakValueDictionary()
+
+
+class BufferPool:
+    """Free list of uint8 arrays, keyed by shape.
+
+    acquire() returns a free buffer of the requested shape (allocating only
+    when none is free), release() gives it back. Buffers of a shape that is
+    no longer requested are dropped once more than `max_free` are idle.
+    """
+
+    def __init__(self, name: str, max_free: int = 4, dtype=np.uint8):
+        self.name = name
+        self.max_free = max_free
+        self.dtype = np.dtype(dtype)
+        self._free: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.allocated = 0
+        _pools[name] = self
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        shape = tuple(int(s) for s in shape)
+        with self._lock:
+            free = self._free.get(shape)
+            self.in_use += 1
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, self.dtype)
+
+    def adopt(self, buf: np.ndarray) -> np.ndarray:
+        """Count a buffer allocated elsewhere (e.g. by cv2) as acquired from this pool."""
+        with self._lock:
+            self.in_use += 1
+            self.allocated += 1
+        return buf
+
+    def release(self, buf: Optional[np.ndarray]) -> None:
+        if buf is None:
+            return
+        with self._lock:
+            self.in_use -= 1
+            free = self._free.setdefault(buf.shape, [])
+            if sum(len(f) for f in self._free.values()) < self.max_free:
+                free.append(buf)
+
+    def stats(self) -> dict:
+        with self._lock:
+            free = [b for f in self._free.values() for b in f]
+            return {
+                "free": len(free),
+                "free_bytes": sum(b.nbytes for b in free),
+                "in_use": self.in_use,
+                "allocated": self.allocated,
+                "shapes": [list(s) for s, f in self._free.items() if f],
+            }
+
+
+def pool_stats() -> Dict[str, dict]:
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+
+# -- live buffers handed out to callers ----------------------------------
+
+# kind -> {id(buf): weakref}; arrays are not hashable, so no WeakSet
+_live: Dict[str, Dict[int, "weakref.ref[np.ndarray]"]] = {}
+
+
+def track(kind: str, buf: np.ndarray) -> np.ndarray:
+    """Count `buf` under `kind` for as long as it is alive; returns buf."""
+    refs = _live.setdefault(kind, {})
+    key = id(buf)
+    # the callback may run inside any thread during GC, so it takes no lock
+    refs[key] = weakref.ref(buf, lambda _r, key=key: refs.pop(key, None))
+    return buf
+
+
+def live_stats() -> Dict[str, dict]:
+    out = {}
+    for kind, refs in list(_live.items()):
+        bufs = [b for b in (r() for r in list(refs.values())) if b is not None]
+        out[kind] = {"count": len(bufs), "bytes": sum(b.nbytes for b in bufs)}
+    return out
+
+
+# -- process memory and tracemalloc ---------------------------------------
+
+def rss() -> Dict[str, int]:
+    """VmRSS / VmHWM / VmSize of this process in bytes (Linux only, else {})."""
+    out = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, val = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "VmSize"):
+                    out[key] = int(val.split()[0]) * 1024
+    except OSError:
+        pass
+    return out
+
+
+_snapshot_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_tracing(frames: int = 10) -> None:
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _last_snapshot = None
+
+
+def stop_tracing() -> None:
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def _site(stat) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def snapshot_report(limit: int = 20) -> dict:
+    """Top allocation sites now and the change since the previous call."""
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    with _snapshot_lock:
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        prev, _last_snapshot = _last_snapshot, snap
+    current, peak = tracemalloc.get_traced_memory()
+    report = {
+        "tracing": True,
+        "traced_bytes": current,
+        "traced_peak": peak,
+        "top": [{"site": _site(s), "size": s.size, "count": s.count}
+                for s in snap.statistics("lineno")[:limit]],
+        "diff": None,
+    }
+    if prev is not None:
+        report["diff"] = [{"site": _site(s), "size_diff": s.size_diff, "count_diff": s.count_diff,
+                           "size": s.size}
+                          for s in snap.compare_to(prev, "lineno")[:limit] if s.size_diff]
+    return report
+
+
+__all__ = [
+    "BufferPool", "pool_stats", "track", "live_stats", "rss",
+    "start_tracing", "stop_tracing", "snapshot_report",
+]
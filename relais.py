@@ -25,6 +25,8 @@ import time
 import threading
 from typing import Optional, Set
 
+import journal
+
 
 # Try to import RPi.GPIO, else provide a harmless dummy for testing on non-Pi systems
 try:
@@ -155,11 +157,13 @@ def setup(up_pin: Optional[int] = None, down_pin: Optional[int] = None, pwr_pin:
     _gpio_initialized = True
 
 
-def _press_blocking(servo_key: str, press_angle: int = 60, hold: float = 0.25, rest_angle: int = _REST_ANGLE):
+def _press_blocking(servo_key: str, press_angle: int = 60, hold: float = 0.25, rest_angle: int = _REST_ANGLE,
+                    pressed: Optional[threading.Event] = None):
     """Blocking worker that actually moves the servo. Intended to run in a thread.
 
     This function acquires a per-servo lock so concurrent presses on the same
-    servo are serialized.
+    servo are serialized. `pressed` (optional) is set once the press angle
+    has been commanded.
     """
     if not _gpio_initialized:
         setup()  # initialize with defaults
@@ -174,6 +178,8 @@ def _press_blocking(servo_key: str, press_angle: int = 60, hold: float = 0.25, r
 
     with lock:
         servo.move_to_angle(press_angle)
+        if pressed is not None:
+            pressed.set()
         time.sleep(hold)
         servo.move_to_angle(rest_angle)
         time.sleep(0.05)
@@ -183,7 +189,8 @@ def _press_blocking(servo_key: str, press_angle: int = 60, hold: float = 0.25, r
     return True
 
 
-def _start_press_thread(servo_key: str, press_angle: int = 60, hold: float = 0.25, rest_angle: int = _REST_ANGLE):
+def _start_press_thread(servo_key: str, press_angle: int = 60, hold: float = 0.25, rest_angle: int = _REST_ANGLE,
+                        pressed: Optional[threading.Event] = None):
     """Start a background thread to run _press_blocking and return the Thread.
 
     Returns the Thread object on success, or False if the servo is not configured.
@@ -193,9 +200,14 @@ def _start_press_thread(servo_key: str, press_angle: int = 60, hold: float = 0.2
     if _servos.get(servo_key) is None:
         return False
 
+    journal.log("servo", name=servo_key, angle=press_angle, hold=hold)
+
     def worker():
         try:
-            _press_blocking(servo_key, press_angle=press_angle, hold=hold, rest_angle=rest_angle)
+            t0 = time.monotonic()
+            _press_blocking(servo_key, press_angle=press_angle, hold=hold, rest_angle=rest_angle,
+                            pressed=pressed)
+            journal.log("servo_done", name=servo_key, duration=round(time.monotonic() - t0, 3))
         finally:
             # remove thread from active set
             try:
@@ -238,6 +250,7 @@ def switch_usb(mode: str, pin: Optional[int] = None) -> bool:
         # OTG is active-low on this hardware: set LOW for OTG, HIGH for USB
         val = GPIO.LOW if m == "otg" else GPIO.HIGH
         GPIO.output(target_pin, val)
+        journal.log("usb", name=m, pin=target_pin)
         return True
     except Exception:
         return False
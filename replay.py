@@ -0,0 +1,127 @@
+"""Replay frame sources for running Pi-Droid without a camera.
+
+`ReplayCapture` mimics the parts of `cv2.VideoCapture` that `CameraThread`
+uses (read/get/set/isOpened/release) but serves frames from a video file, a
+directory of images or a single image, looping forever at a fixed rate. This
+lets `Server.py` and the load/benchmark tools run on a plain Linux machine.
+
+`open_source` turns a `--source` argument into a capture object:
+  - "0", "1", ...      -> cv2.VideoCapture(index) (a real camera)
+  - path to a video    -> ReplayCapture of the video
+  - directory / image  -> ReplayCapture of the image(s), sorted by name
+  - "synth" / "synth:<seed>" -> ReplayCapture of frames rendered by synth.py
+"""
+
+from typing import List, Optional, Union
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp")
+DEFAULT_FPS = 30.0
+# frames rendered (and then looped) for a "synth" source
+SYNTH_FRAMES = 64
+
+
+def _load_images(path: str) -> List[np.ndarray]:
+    if os.path.isdir(path):
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                 if f.lower().endswith(IMAGE_SUFFIXES)]
+    else:
+        files = [path]
+    frames = [img for img in (cv.imread(f, cv.IMREAD_COLOR) for f in files) if img is not None]
+    if not frames:
+        raise FileNotFoundError(f"No images found at {path}")
+    return frames
+
+
+class ReplayCapture:
+    """Looping, rate-limited stand-in for cv2.VideoCapture."""
+
+    def __init__(self, path: str, fps: float = DEFAULT_FPS,
+                 frames: Optional[List[np.ndarray]] = None):
+        self.path = path
+        self.fps = float(fps)
+        self._frames: Optional[List[np.ndarray]] = None
+        self._video = None
+        if frames is not None:
+            self._frames = list(frames)
+        elif os.path.isdir(path) or path.lower().endswith(IMAGE_SUFFIXES):
+            self._frames = _load_images(path)
+        else:
+            self._video = cv.VideoCapture(path)
+            if not self._video.isOpened():
+                raise FileNotFoundError(f"Cannot open video {path}")
+        self._index = 0
+        self._next = time.monotonic()
+        self._last_ts = 0.0
+
+    def isOpened(self) -> bool:
+        return self._frames is not None or (self._video is not None and self._video.isOpened())
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self._frames is not None:
+            frame = self._frames[self._index % len(self._frames)]
+            self._index += 1
+            return frame.copy()
+        ok, frame = self._video.read()
+        if not ok:
+            self._video.set(cv.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._video.read()
+        return frame if ok else None
+
+    def read(self, image: Optional[np.ndarray] = None):
+        # pace like a camera: block until the next frame interval
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next + 1.0 / self.fps, time.monotonic() - 1.0 / self.fps)
+        frame = self._next_frame()
+        self._last_ts = time.monotonic()
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            frame = image
+        return True, frame
+
+    def grab(self) -> bool:
+        # nothing is queued behind a replay, so there is no stale frame to drop
+        return self.isOpened()
+
+    def get(self, prop: int) -> float:
+        if prop == cv.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv.CAP_PROP_POS_MSEC:
+            # behaves like V4L2: buffer timestamp on the monotonic clock
+            return self._last_ts * 1000.0
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop == cv.CAP_PROP_FPS and value > 0:
+            self.fps = float(value)
+            return True
+        return False
+
+    def release(self) -> None:
+        if self._video is not None:
+            self._video.release()
+
+
+def open_source(source: Union[int, str, None], fps: float = DEFAULT_FPS):
+    """Open a camera index or a replay path (see module docstring)."""
+    if source is None:
+        return cv.VideoCapture(0)
+    if isinstance(source, int) or str(source).isdigit():
+        return cv.VideoCapture(int(source))
+    if str(source).split(":", 1)[0] == "synth":
+        import synth
+        seed = int(str(source).partition(":")[2] or 0)
+        frames = [s.frame for s in synth.generate(SYNTH_FRAMES, seed=seed)]
+        return ReplayCapture(str(source), fps=fps, frames=frames)
+    return ReplayCapture(str(source), fps=fps)
+
+
+__all__ = ["ReplayCapture", "open_source"]
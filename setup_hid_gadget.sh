@@ -2,6 +2,9 @@
 set -euo pipefail
 
 GADGET_DIR=/sys/kernel/config/usb_gadget/hidg1
+# Polling-Intervall der HID-Endpunkte (bInterval; Full-Speed: ms,
+# High-Speed: 2^(n-1) * 125us). Überschreibbar: HID_INTERVAL=4 ./setup_hid_gadget.sh
+HID_INTERVAL="${HID_INTERVAL:-1}"
 
 if [ "$(id -u)" -ne 0 ]; then
   echo "Bitte als root ausführen (sudo)."
@@ -30,7 +33,7 @@ echo 0x0200 > bcdUSB
 
 mkdir -p strings/0x409
 echo "Raspberry Pi" > strings/0x409/manufacturer
-echo "Pi HID Keyboard" > strings/0x409/product
+echo "Pi HID Keyboard + Consumer Control" > strings/0x409/product
 echo "0001" > strings/0x409/serialnumber
 
 mkdir -p configs/c.1
@@ -49,8 +52,27 @@ echo 8 > functions/hid.usb0/report_length
 # report descriptor bytes
 echo -ne '\x05\x01\x09\x06\xa1\x01\x05\x07\x19\xe0\x29\xe7\x15\x00\x25\x01\x75\x01\x95\x08\x81\x02\x95\x01\x75\x08\x81\x03\x95\x06\x75\x08\x15\x00\x25\x65\x05\x07\x19\x00\x29\x65\x81\x00\xc0' > functions/hid.usb0/report_desc
 
+# Consumer Control (Lautstärke, Power) -> /dev/hidg1
+# 2-Byte-Report: eine Usage-ID (0..0x3FF, Low-Byte zuerst), 0 = losgelassen.
+# Passt zu hid_input.send_consumer_usage / actuate.py.
+mkdir -p functions/hid.usb1
+echo 0 > functions/hid.usb1/protocol
+echo 0 > functions/hid.usb1/subclass
+echo 2 > functions/hid.usb1/report_length
+echo -ne '\x05\x0c\x09\x01\xa1\x01\x15\x00\x26\xff\x03\x19\x00\x2a\xff\x03\x75\x10\x95\x01\x81\x00\xc0' > functions/hid.usb1/report_desc
+
+# Polling-Intervall setzen; ältere Kernel haben das Attribut nicht (dann gilt der Standard 4)
+for fn in functions/hid.usb0 functions/hid.usb1; do
+  if [ -f "$fn/interval" ]; then
+    echo "$HID_INTERVAL" > "$fn/interval"
+  else
+    echo "Hinweis: $fn/interval fehlt (Kernel zu alt), Polling-Intervall bleibt Standard."
+  fi
+done
+
 # verknüpfen und aktivieren
 ln -s functions/hid.usb0 configs/c.1/
+ln -s functions/hid.usb1 configs/c.1/
 UDC=$(ls /sys/class/udc | head -n1)
 if [ -z "$UDC" ]; then
   echo "Keine UDC gefunden. Prüfe, ob dein Pi OTG unterstützt und das dwc2 overlay aktiv ist."
@@ -60,4 +82,4 @@ fi
 echo "$UDC" > UDC
 
 echo "HID gadget erstellt und an UDC $UDC gebunden."
-echo "/dev/hidg0 sollte nun vorhanden sein (auf dem Pi)."
+echo "/dev/hidg0 (Tastatur) und /dev/hidg1 (Consumer Control) sollten nun vorhanden sein (auf dem Pi)."
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+synth.py
+
+Render synthetic phone-screen frames with the region layout of `config.json`
+and ground-truth labels, so matchers, OCR engines and preprocessing can be
+compared reproducibly without the phone.
+
+Every region gets a `match` label (does it show its calibrated template?)
+and, when text was drawn into it, a `text` label:
+  - Home, Swipe: the template from templates/region_<Name>.png (or a drawn
+    icon when none is saved yet) when matching, otherwise an empty or
+    different icon
+  - Info_text, Code: the template when matching, otherwise random digits
+    rendered into the rectangle (text label = those digits)
+
+`Variation` controls the camera-like distortions applied to the whole frame:
+sub-pixel shift, blur, brightness/contrast, moiré and sensor noise.
+
+The generator plugs into the existing tools:
+  - `python Server.py --source synth` (or synth:<seed>) replays generated
+    frames through `replay.py`
+  - `python matcher_bench.py --region Home --synth 50` benchmarks matchers
+    on generated positives/negatives
+  - `python synth.py evaluate` measures accuracy and latency of `cam.check`
+    and `cam.get_text` together
+
+Example:
+    python synth.py generate --out rec/synth --count 200 --noise 6 --blur 0.8
+    python synth.py evaluate --count 100 --moire 10 --shift 1.5
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+import cam
+
+FRAME_SIZE = (1280, 720)
+TEXT_REGIONS = ("Info_text", "Code")
+BACKGROUND = (38, 32, 30)
+
+
+class Variation(NamedTuple):
+    """Distortion parameters; each frame draws its own values up to these limits."""
+    noise: float = 3.0        # std of gaussian sensor noise (0..255 scale)
+    blur: float = 0.6         # max gaussian blur sigma in pixels
+    brightness: float = 0.1   # max relative brightness/contrast change
+    moire: float = 0.0        # amplitude of the interference pattern
+    shift: float = 0.5        # max sub-pixel shift in pixels (x and y)
+
+
+class SynthFrame(NamedTuple):
+    frame: np.ndarray
+    labels: Dict[str, dict]
+    params: dict
+
+
+def _fit_text(img: np.ndarray, text: str, color=(235, 235, 235)) -> None:
+    """Draw text centered and scaled to fill the image."""
+    h, w = img.shape[:2]
+    font = cv.FONT_HERSHEY_SIMPLEX
+    (tw, th), base = cv.getTextSize(text, font, 1.0, 2)
+    scale = min(0.9 * w / tw, 0.8 * h / (th + base))
+    thick = max(1, int(round(2 * scale)))
+    (tw, th), base = cv.getTextSize(text, font, scale, thick)
+    org = ((w - tw) // 2, (h + th) // 2)
+    cv.putText(img, text, org, font, scale, color, thick, cv.LINE_AA)
+
+
+def _draw_icon(img: np.ndarray, name: str, variant: int = 0) -> None:
+    h, w = img.shape[:2]
+    c = (w // 2, h // 2)
+    r = max(3, min(w, h) // 3)
+    color = (230, 230, 230)
+    if variant == 0 and name == "Home":
+        cv.circle(img, c, r, color, max(1, r // 5), cv.LINE_AA)
+    elif variant == 0:
+        pts = np.array([[c[0] - r, c[1] + r // 2], [c[0], c[1] - r // 2], [c[0] + r, c[1] + r // 2]], np.int32)
+        cv.polylines(img, [pts], False, color, max(1, r // 4), cv.LINE_AA)
+    else:
+        cv.rectangle(img, (c[0] - r, c[1] - r), (c[0] + r, c[1] + r), color, -1)
+
+
+def _template(name_key: str, w: int, h: int) -> Optional[np.ndarray]:
+    try:
+        tmpl = cam._load_template(name_key)
+    except (FileNotFoundError, RuntimeError):
+        return None
+    return cv.resize(tmpl, (w, h), interpolation=cv.INTER_AREA)
+
+
+def _distort(frame: np.ndarray, var: Variation, rng: np.random.Generator) -> Tuple[np.ndarray, dict]:
+    dx, dy = rng.uniform(-var.shift, var.shift, 2) if var.shift > 0 else (0.0, 0.0)
+    sigma = float(rng.uniform(0, var.blur)) if var.blur > 0 else 0.0
+    gain = 1.0 + float(rng.uniform(-var.brightness, var.brightness))
+    bias = 255.0 * float(rng.uniform(-var.brightness, var.brightness)) / 2
+    params = {"shift": [float(dx), float(dy)], "blur": sigma, "gain": gain, "bias": bias}
+
+    h, w = frame.shape[:2]
+    if dx or dy:
+        M = np.float32([[1, 0, dx], [0, 1, dy]])
+        frame = cv.warpAffine(frame, M, (w, h), flags=cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+    if sigma > 0.05:
+        frame = cv.GaussianBlur(frame, (0, 0), sigma)
+    out = frame.astype(np.float32) * gain + bias
+    if var.moire > 0:
+        # interference of the phone's pixel grid with the sensor: a slightly
+        # rotated high-frequency pattern beating against a period near 3 px
+        angle = float(rng.uniform(0, np.pi))
+        period = float(rng.uniform(2.8, 3.4))
+        yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+        phase = (xx * np.cos(angle) + yy * np.sin(angle)) * (2 * np.pi / period)
+        out += (var.moire * np.sin(phase))[..., None]
+        params.update(moire_angle=angle, moire_period=period)
+    if var.noise > 0:
+        out += rng.normal(0, var.noise, out.shape).astype(np.float32)
+    return np.clip(out, 0, 255).astype(np.uint8), params
+
+
+def render(states: Optional[Dict[str, bool]] = None, variation: Variation = Variation(),
+           rng: Optional[np.random.Generator] = None, cfg: Optional[dict] = None) -> SynthFrame:
+    """Render one frame.
+
+    states: region name -> True to show its template (default: random)
+    """
+    rng = rng or np.random.default_rng()
+    cfg = cfg or cam._load_config()
+    states = states or {}
+    w, h = FRAME_SIZE
+    frame = np.empty((h, w, 3), np.uint8)
+    frame[:] = BACKGROUND
+    # some screen structure outside the regions
+    for _ in range(6):
+        y = int(rng.integers(0, h - 20))
+        cv.rectangle(frame, (0, y), (w, y + int(rng.integers(2, 20))),
+                     tuple(int(v) for v in rng.integers(20, 80, 3)), -1)
+
+    labels = {}
+    for name in cfg.get("REGIONS", {}):
+        x, y, rw, rh = cam._get_region_coords(cfg, name)
+        roi = frame[y:y + rh, x:x + rw]
+        roi[:] = BACKGROUND
+        matched = bool(states[name]) if name in states else bool(rng.random() < 0.5)
+        label = {"match": matched, "text": None}
+        if matched:
+            tmpl = _template(name, rw, rh)
+            if tmpl is not None:
+                roi[:] = tmpl
+            else:
+                _draw_icon(roi, name, 0)
+        elif name in TEXT_REGIONS:
+            text = "".join(str(d) for d in rng.integers(0, 10, int(rng.integers(3, 6))))
+            _fit_text(roi, text)
+            label["text"] = text
+        elif rng.random() < 0.5:
+            _draw_icon(roi, name, 1)
+        labels[name] = label
+
+    frame, params = _distort(frame, variation, rng)
+    return SynthFrame(frame, labels, params)
+
+
+def generate(count: int, variation: Variation = Variation(), seed: int = 0,
+             states: Optional[Dict[str, bool]] = None) -> Iterator[SynthFrame]:
+    """Yield `count` reproducible frames for the given seed."""
+    rng = np.random.default_rng(seed)
+    cfg = cam._load_config()
+    for _ in range(count):
+        yield render(states, variation, rng, cfg)
+
+
+def frames_for_region(region: str, count: int, variation: Variation = Variation(),
+                      seed: int = 0) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Positive and negative frames for one region (for matcher_bench.py)."""
+    name_key = cam._normalize_name(region)
+    pos = [s.frame for s in generate(count, variation, seed, {name_key: True})]
+    neg = [s.frame for s in generate(count, variation, seed + 1, {name_key: False})]
+    return pos, neg
+
+
+def save(frames: Iterator[SynthFrame], out_dir: str) -> int:
+    """Write frame_NNNNN.png files plus labels.jsonl; returns the frame count."""
+    os.makedirs(out_dir, exist_ok=True)
+    n = 0
+    with open(os.path.join(out_dir, "labels.jsonl"), "w", encoding="utf-8") as f:
+        for n, s in enumerate(frames, 1):
+            fname = f"frame_{n:05d}.png"
+            cv.imwrite(os.path.join(out_dir, fname), s.frame)
+            f.write(json.dumps({"file": fname, "labels": s.labels, "params": s.params}) + "\n")
+    return n
+
+
+def evaluate(frames: Iterator[SynthFrame], ocr_func=None) -> Dict[str, dict]:
+    """Accuracy and median latency of cam.check / cam.get_text per region."""
+    res: Dict[str, dict] = {}
+    for s in frames:
+        for name, label in s.labels.items():
+            r = res.setdefault(name, {"check_ok": 0, "check_n": 0, "check_us": [],
+                                      "text_ok": 0, "text_n": 0, "text_us": [], "text_error": None})
+            t0 = time.perf_counter()
+            try:
+                ok = cam.check(name, frame=s.frame)
+            except (FileNotFoundError, RuntimeError):
+                ok = None
+            r["check_us"].append((time.perf_counter() - t0) * 1e6)
+            if ok is not None:
+                r["check_n"] += 1
+                r["check_ok"] += int(ok == label["match"])
+            if label["text"] is not None and r["text_error"] is None:
+                t0 = time.perf_counter()
+                try:
+                    text = cam.get_text(name, ocr_func, frame=s.frame)
+                except RuntimeError as e:
+                    r["text_error"] = str(e)
+                    continue
+                r["text_us"].append((time.perf_counter() - t0) * 1e6)
+                r["text_n"] += 1
+                r["text_ok"] += int("".join(text.split()) == label["text"])
+
+    out = {}
+    for name, r in res.items():
+        out[name] = {
+            "check_accuracy": r["check_ok"] / r["check_n"] if r["check_n"] else None,
+            "check_median_us": float(np.median(r["check_us"])) if r["check_us"] else None,
+            "text_accuracy": r["text_ok"] / r["text_n"] if r["text_n"] else None,
+            "text_median_us": float(np.median(r["text_us"])) if r["text_us"] else None,
+            "text_error": r["text_error"],
+        }
+    return out
+
+
+def print_evaluation(results: Dict[str, dict]) -> None:
+    def fmt(v, spec):
+        return format(v, spec) if v is not None else "-"
+    print(f"{'region':<10} {'check acc':>9} {'check us':>9} {'text acc':>9} {'text us':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {fmt(r['check_accuracy'], '>9.3f')} {fmt(r['check_median_us'], '>9.1f')} "
+              f"{fmt(r['text_accuracy'], '>9.3f')} {fmt(r['text_median_us'], '>9.1f')}"
+              + (f"  ({r['text_error']})" if r["text_error"] else ""))
+
+
+def add_variation_args(parser: argparse.ArgumentParser) -> None:
+    d = Variation()
+    parser.add_argument("--noise", type=float, default=d.noise, help="Sensor noise std")
+    parser.add_argument("--blur", type=float, default=d.blur, help="Max blur sigma")
+    parser.add_argument("--brightness", type=float, default=d.brightness, help="Max brightness/contrast change")
+    parser.add_argument("--moire", type=float, default=d.moire, help="Moiré amplitude")
+    parser.add_argument("--shift", type=float, default=d.shift, help="Max sub-pixel shift")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def variation_from_args(args) -> Variation:
+    return Variation(args.noise, args.blur, args.brightness, args.moire, args.shift)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Pi-Droid screen frames with ground truth.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    gen = sub.add_parser("generate", help="Write frames and labels.jsonl to a directory")
+    gen.add_argument("--out", "-o", required=True, help="Output directory")
+    gen.add_argument("--count", "-c", type=int, default=100)
+    add_variation_args(gen)
+    ev = sub.add_parser("evaluate", help="Measure cam.check / cam.get_text on generated frames")
+    ev.add_argument("--count", "-c", type=int, default=50)
+    add_variation_args(ev)
+    args = parser.parse_args()
+
+    frames = generate(args.count, variation_from_args(args), args.seed)
+    if args.cmd == "generate":
+        n = save(frames, args.out)
+        print(f"Wrote {n} frames to {args.out}")
+    else:
+        print_evaluation(evaluate(frames))
+
+
+if __name__ == "__main__":
+    main()